@@ -0,0 +1,159 @@
+"""
+query the events of many pools in parallel worker processes.
+
+Every pool of the manifest runs v2_events_getter.query_v2_events or
+v3_events_getter.query_v3_events (when it has a fee_rate) in its own worker.
+Workers that query the same RPC endpoint share one requests-per-second budget.
+"""
+import os
+import sys
+import json
+from dotenv import load_dotenv
+from datetime import datetime, timezone
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from log_fetcher import RateLimiter
+from v2_events_getter import query_v2_events
+from v3_events_getter import query_v3_events
+
+load_dotenv()
+
+_next_slots = {}  # next request slot of each RPC endpoint, shared by the workers
+
+
+def _init_worker(next_slots):
+    global _next_slots
+    _next_slots = next_slots
+
+
+def pool_label(pool):
+    label = (
+        f"{pool['network']}_{pool['dex']}_{pool['base_token']}_{pool['quote_token']}"
+    )
+    if "fee_rate" in pool:
+        label += f"_{int(pool['fee_rate']/100)}bps"
+    return label
+
+
+def _query_pool(pool, start_timestamp, end_timestamp, requests_per_second):
+    rate_limiter = RateLimiter(
+        requests_per_second,
+        next_slot=_next_slots[os.getenv(f"{pool['network']}_ALCHEMY_URL")],
+    )
+    start_time = time.perf_counter()
+    print(f"{pool_label(pool)}: start!")
+    if "fee_rate" in pool:
+        query_v3_events(
+            start_timestamp,
+            end_timestamp,
+            pool["network"],
+            pool["dex"],
+            pool["base_token"],
+            pool["quote_token"],
+            pool["fee_rate"],
+            rate_limiter=rate_limiter,
+        )
+    else:
+        query_v2_events(
+            start_timestamp,
+            end_timestamp,
+            pool["network"],
+            pool["dex"],
+            pool["base_token"],
+            pool["quote_token"],
+            rate_limiter=rate_limiter,
+        )
+    return time.perf_counter() - start_time
+
+
+def run_batch(
+    manifest, start_timestamp, end_timestamp, max_workers=8, requests_per_second=25
+):
+    """
+    Query every pool of the manifest, at most (max_workers) pools at once.
+    (requests_per_second) is the budget of each RPC endpoint,
+    shared by all pools on it.
+    A failed pool does not stop the others; rerun the batch to resume it
+    from its checkpoint.
+    """
+    next_slots = {
+        os.getenv(f"{pool['network']}_ALCHEMY_URL"): multiprocessing.Value("d", 0.0)
+        for pool in manifest
+    }
+
+    batch_start_time = time.perf_counter()
+    summary = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(next_slots,)
+    ) as executor:
+        futures = {
+            executor.submit(
+                _query_pool, pool, start_timestamp, end_timestamp, requests_per_second
+            ): pool_label(pool)
+            for pool in manifest
+        }
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                summary[label] = f"{int(future.result())} seconds"
+            except Exception as e:
+                summary[label] = f"failed ({e})"
+            print(f"{label}: {summary[label]}")
+
+    # timing summary
+    print("=" * 80)
+    for pool in manifest:
+        print(f"{pool_label(pool):<40} {summary[pool_label(pool)]}")
+    print(f"Total: {int(time.perf_counter() - batch_start_time)} seconds.")
+    return summary
+
+
+if __name__ == "__main__":
+    start_timestamp = int(datetime(2023, 10, 1, tzinfo=timezone.utc).timestamp())
+    end_timestamp = int(datetime(2023, 12, 1, tzinfo=timezone.utc).timestamp())
+
+    if len(sys.argv) > 1:
+        # json file with a list of pools, e.g. [{"network": "MAINNET",
+        # "dex": "UNI_V3", "base_token": "WETH", "quote_token": "USDC", "fee_rate": 500}]
+        with open(sys.argv[1]) as f:
+            manifest = json.load(f)
+    else:
+        manifest = [
+            # v2 pairs
+            {"network": network, "dex": dex, "base_token": "WETH", "quote_token": quote}
+            for network, dex, quote in [
+                ("MAINNET", "SUSHI", "USDC"),
+                ("MAINNET", "SUSHI", "USDT"),
+                ("MAINNET", "SUSHI", "DAI"),
+                ("MAINNET", "SUSHI", "WBTC"),
+                ("MAINNET", "UNI_V2", "USDC"),
+                ("MAINNET", "UNI_V2", "USDT"),
+                ("MAINNET", "UNI_V2", "DAI"),
+                ("MAINNET", "UNI_V2", "WBTC"),
+                ("ARBITRUM", "CAMELOT", "USDCe"),
+                ("ARBITRUM", "CAMELOT", "WBTC"),
+                ("ARBITRUM", "SUSHI", "USDC"),
+                ("ARBITRUM", "SUSHI", "USDT"),
+                ("ARBITRUM", "SUSHI", "DAI"),
+                ("ARBITRUM", "SUSHI", "USDCe"),
+                ("ARBITRUM", "SUSHI", "WBTC"),
+            ]
+        ] + [
+            # v3 pools
+            {
+                "network": network,
+                "dex": "UNI_V3",
+                "base_token": "WETH",
+                "quote_token": quote,
+                "fee_rate": fee_rate,
+            }
+            for network, quotes in [
+                ("MAINNET", ["USDC", "USDT", "DAI", "WBTC"]),
+                ("ARBITRUM", ["USDC", "USDT", "DAI", "USDCe", "WBTC"]),
+            ]
+            for fee_rate in [500, 3000, 10000]
+            for quote in quotes
+        ]
+
+    run_batch(manifest, start_timestamp, end_timestamp)
@@ -1,48 +1,147 @@
 import os
+import sys
+import glob
+import json
+import struct
+import numpy as np
 import polars as pl
-import pandas as pd
 from utils import *
-import glob
 
-# ETHEREUM blocks
-data_path = "./data/blocks/ethereum__blocks__*.parquet"
-data_path = os.path.expanduser(data_path)
-
-timestamps_blocks_fees = (
-    pl.scan_parquet(data_path)
-    .select(pl.col("block_number", "timestamp", "base_fee_per_gas"))
-    .collect(streaming=True)
-    .to_numpy()
-)
-
-df = pd.DataFrame(
-    timestamps_blocks_fees, columns=["blockNumber", "timestamp", "baseFeePerGas"]
-)
-
-df.to_csv("./data/blocks/blockNumber_timestamp_baseFeePerGas.csv", index=False)
-
-# ARBITRUM blocks
-data_path = "./data/arbitrum_blocks/arbitrum_blocks_*.csv"
-data_list = glob.glob(data_path)
-dataframes = [pl.read_csv(data) for data in data_list]
-
-for i in range(len(dataframes)):
-    dataframes[i] = dataframes[i].with_columns(
-        [
-            (
-                pl.col("timestamp").str.strptime(
-                    pl.Datetime, "%Y-%m-%d %H:%M:%S%.f UTC", strict=False
-                )
-                / 1000000000
-            ).cast(pl.Int64)
-        ]
+"""
+compact the raw block metadata of a network into one binary dataset, read by
+utils.read_blocks and utils.load_block_index.
+
+data/{network}_blocks/{column}.npy    int64 blockNumber, timestamp and baseFeePerGas,
+                                      sorted by blockNumber without duplicates
+data/{network}_blocks/blocks.json     {"first", "last", "count", "gaps": [[first, last], ...]}
+
+The raw files are read one at a time, in the order of their first block, and their
+rows are appended to the columns, so the memory is bounded by the largest raw file
+however many blocks the network has. Blocks already written by an overlapping file
+are dropped, and the ranges of missing blocks are recorded as gaps.
+
+    python blocks_formatter.py            every network of RAW_BLOCKS
+    python blocks_formatter.py ARBITRUM
+"""
+
+# raw files of the network, and the base fee of the blocks without one
+# (the minimum L2 base fee of Arbitrum, 0.1 gwei in 2023)
+RAW_BLOCKS = {
+    "MAINNET": ("./data/MAINNET_blocks/ethereum__blocks__*.parquet", None),
+    "ARBITRUM": ("./data/ARBITRUM_blocks/arbitrum_blocks_*.csv", 10**8),
+}
+HEADER_SIZE = 128  # bytes of the .npy headers, large enough for any block count
+
+
+def read_raw_blocks(path, base_fee=None):
+    """
+    DataFrame of BLOCK_COLUMNS of a cryo parquet file or a BigQuery csv export,
+    sorted by blockNumber without duplicates. (base_fee) is the base fee of
+    the blocks without one.
+    """
+    columns = ["block_number", "timestamp", "base_fee_per_gas"]
+    if path.endswith(".parquet"):
+        has_base_fee = columns[2] in pl.read_parquet_schema(path)
+    else:
+        has_base_fee = columns[2] in pl.read_csv(path, n_rows=0).columns
+    read_columns = columns if has_base_fee or base_fee is None else columns[:2]
+    if path.endswith(".parquet"):
+        df = pl.read_parquet(path, columns=read_columns)
+    else:
+        df = pl.read_csv(path, columns=read_columns)
+
+    if df["timestamp"].dtype == pl.Utf8:
+        # e.g. 2023-10-01 00:00:00.123 UTC
+        df = df.with_columns(
+            pl.col("timestamp")
+            .str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S%.f UTC")
+            .dt.epoch("s")
+        )
+    if columns[2] not in df.columns:
+        df = df.with_columns(pl.lit(base_fee).alias(columns[2]))
+    elif base_fee is not None:
+        df = df.with_columns(pl.col(columns[2]).fill_null(base_fee))
+
+    return (
+        df.select(pl.col(columns).cast(pl.Int64))
+        .rename(dict(zip(columns, BLOCK_COLUMNS)))
+        .sort("blockNumber")
+        .unique("blockNumber", keep="first", maintain_order=True)
     )
 
-df = pl.concat(dataframes)
-df = df.sort("block_number")
-df = df.rename({"block_number": "blockNumber"})
-df.write_csv("./data/arbitrum_blocks/blockNumber_timestamp_baseFeePerGas.csv")
 
-df = pd.read_csv("./data/arbitrum_blocks/blockNumber_timestamp_baseFeePerGas.csv")
-df["baseFeePerGas"] = 10**8
-df.to_csv("./data/arbitrum_blocks/blockNumber_timestamp_baseFeePerGas.csv", index=False)
+def first_block(path):
+    if path.endswith(".parquet"):
+        lf = pl.scan_parquet(path)
+    else:
+        lf = pl.scan_csv(path)
+    return lf.select(pl.col("block_number").min()).collect().item()
+
+
+def compact_blocks(network, paths, base_fee=None):
+    """
+    Write the blocks of the raw files (paths) as the binary dataset of the network.
+    """
+    blocks_path = BLOCKS_PATH.format(network=network)
+    os.makedirs(blocks_path, exist_ok=True)
+    files = {
+        column: open(f"{blocks_path}/{column}.npy.tmp", "wb")
+        for column in BLOCK_COLUMNS
+    }
+    first = None
+    last = None
+    count = 0
+    gaps = []
+    try:
+        for f in files.values():
+            f.write(_npy_header(0))
+
+        for path in sorted(paths, key=first_block):
+            df = read_raw_blocks(path, base_fee)
+            if last is not None:
+                df = df.filter(pl.col("blockNumber") > last)
+            if df.is_empty():
+                print(f"{network}: {os.path.basename(path)} has no new blocks.")
+                continue
+
+            numbers = df["blockNumber"].to_numpy()
+            previous = numbers[:-1] if last is None else np.append(last, numbers[:-1])
+            following = numbers[1:] if last is None else numbers
+            for i in np.flatnonzero(following - previous > 1):
+                gaps.append([int(previous[i]) + 1, int(following[i]) - 1])
+                print(f"{network}: blocks {gaps[-1][0]} to {gaps[-1][1]} are missing.")
+
+            for column, f in files.items():
+                f.write(df[column].to_numpy().astype("<i8").tobytes())
+            first = int(numbers[0]) if first is None else first
+            last = int(numbers[-1])
+            count += len(df)
+
+        for f in files.values():
+            f.seek(0)
+            f.write(_npy_header(count))
+    finally:
+        for f in files.values():
+            f.close()
+
+    for column in BLOCK_COLUMNS:
+        os.replace(f"{blocks_path}/{column}.npy.tmp", f"{blocks_path}/{column}.npy")
+    with open(f"{blocks_path}/blocks.json", "w") as f:
+        json.dump({"first": first, "last": last, "count": count, "gaps": gaps}, f)
+    print(f"{network}: {count} blocks from {first} to {last}, {len(gaps)} gaps.")
+
+
+def _npy_header(length):
+    """
+    .npy header of (length) int64 values, padded to HEADER_SIZE bytes so that
+    the final length can be written over the initial one.
+    """
+    header = "{'descr': '<i8', 'fortran_order': False, 'shape': (%d,), }" % length
+    header = header.ljust(HEADER_SIZE - 11) + "\n"
+    return np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header.encode()
+
+
+if __name__ == "__main__":
+    for network in sys.argv[1:] or RAW_BLOCKS:
+        (pattern, base_fee) = RAW_BLOCKS[network]
+        compact_blocks(network, glob.glob(pattern), base_fee)
@@ -1,612 +1,391 @@
 """
 processing data on Uniswap V2 & V3 and its forks. 
 """
-import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
-import web3
-from decimal import Decimal
-import time
 import pandas as pd
-import polars as pl
 import numpy as np
 from utils import *
-import matplotlib.pyplot as plt
+import polars_processor
+from parameter_cache import cached_frame
+from price_store import read_pair_prices, pair_price_paths
+from pool_models import CONSTANT_PRODUCT, CONCENTRATED_LIQUIDITY
+from gas_costs import L1_DATA_UNITS, l1_data_fee, gas_cost_paths
+from kernels import (
+    lagged_returns,
+    rolling_vol_squared,
+    trade_probability,
+    prediction_rates,
+    classify_blocks,
+)
 
 load_dotenv()
 
+# columns of the per interval frame
+INTERVAL_COLUMNS = [
+    "timestamp",
+    "meanVolSquared",
+    "meanPoolValue",
+    "meanBaseFeePerGas",
+    "expectedLVRperPoolValue",  # for error analysis
+    "realizedLVRperPoolValue",  # for error analysis
+    "expectedARBperPoolValue",  # for error analysis
+    "realizedARBperPoolValueWithoutGas",  # for error analysis
+    "realizedARBperPoolValueWithGas",  # for error analysis
+]
+
 
 def v2_swaps_and_arbitrages(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    backend="pandas",
+    latency=None,
+    gas=None,
 ):
     """
     Read files, compute the parameters, theoretical predictions, then
     compare them against realized data.
+    backend="polars" runs the same processing as one polars LazyFrame query.
+    latency: seconds between the cex price and the block, see cex_latency.
+    gas: gas units of an arbitrage, those of the pool model if not given.
     """
-    ############################################################
-    #                        read files                        #
-    ############################################################
-
-    events_df = pd.read_csv(
-        f"data/onchain_events/{network}_{dex}_{base_token}_{quote_token}_events.csv"
-    )
-    blocks_df = pd.read_csv(
-        f"data/{network}_blocks/blockNumber_timestamp_baseFeePerGas.csv"
-    )
-    cex_price_df = pd.read_csv(
-        f"data/cex_price/{token_to_ticker(base_token)}{token_to_ticker(quote_token)}_total.csv"
-    )
-    """
-    For the case of Mainnet, we will refer the price 4 seconds before the block timestamp. 
-    This is when the block building auction ends usually.
-    It is also turned out that arbitrageurs get maximal profit if they execute 
-    the order at that moment. See 
-    https://ethresear.ch/t/empirical-analysis-of-cross-domain-cex-dex-arbitrage-on-ethereum/17620
-    """
-    if network == "MAINNET":
-        cex_price_df["price"] = (
-            cex_price_df["price"].shift(4).fillna(cex_price_df["price"][0])
+    if backend == "polars":
+        return polars_processor.v2_swaps_and_arbitrages(
+            network,
+            dex,
+            base_token,
+            quote_token,
+            fee,
+            use_instant_volatility,
+            interval,
+            window,
+            latency,
+            gas,
         )
 
-    ############################################################
-    #                    compute parameters                    #
-    ############################################################
+    return swaps_and_arbitrages(
+        CONSTANT_PRODUCT,
+        network,
+        dex,
+        base_token,
+        quote_token,
+        fee,
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+        gas,
+    )
 
-    cex_price_df["return"] = (
-        cex_price_df["price"]
-        - cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    ) / cex_price_df["price"].shift(interval).fillna(
-        cex_price_df["price"][0]
-    )  # arithmetic return
-    cex_price_df["logReturn"] = np.log(
-        cex_price_df["price"]
-        / cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    )  # logarithmic return
 
-    if use_instant_volatility:
-        """
-        Instantaneous volatility from return.
-        For the derivation see http://dx.doi.org/10.3905/jpm.1994.409478
-        """
-        cex_price_df["volSquared"] = 2 * (
-            cex_price_df["return"] - cex_price_df["logReturn"]
-        )  # difference in arithmetic and logarithmic return
-    else:
-        """
-        Rolling volatility from logarithmic return.
-        We rollover (window) samples with step size being (interval).
-        """
-        cex_price_df["modulus"] = (
-            cex_price_df["timestamp"] - cex_price_df["timestamp"].min()
-        ) % interval
+def v3_swaps_and_arbitrages(
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    backend="pandas",
+    latency=None,
+    gas=None,
+):
+    if backend == "polars":
+        return polars_processor.v3_swaps_and_arbitrages(
+            network,
+            dex,
+            base_token,
+            quote_token,
+            fee,
+            use_instant_volatility,
+            interval,
+            window,
+            latency,
+            gas,
+        )
 
-        for i in range(interval):
-            # filter the indexes
-            mask = cex_price_df["modulus"] == i
-            masked_logReturns = cex_price_df.loc[mask, "logReturn"]
-
-            # j >= window
-            std_squared = masked_logReturns.rolling(window).std() ** 2
-            cex_price_df.loc[mask, "volSquared"] = std_squared
-
-            # 2 <= j < window
-            for j in range(2, window):
-                cex_price_df.loc[i + interval * (j - 1), "volSquared"] = (
-                    masked_logReturns[:j].std() ** 2
-                )
-
-            # j = 1: we use instantaneous volatility
-            cex_price_df.loc[i, "volSquared"] = 2 * (
-                cex_price_df.loc[i, "return"] - cex_price_df.loc[i, "logReturn"]
-            )
-    cex_price_df["volSquared"] *= (
-        60 * 60 * 24 / interval
-    )  # convert into daily timeframe.
+    return swaps_and_arbitrages(
+        CONCENTRATED_LIQUIDITY,
+        network,
+        dex,
+        base_token,
+        quote_token,
+        fee,
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+        gas,
+    )
 
-    cex_price_df.fillna(0, inplace=True)
 
-    blocks_price = pd.merge(blocks_df, cex_price_df, on="timestamp", how="left")
-    blocks_price["lambda"] = (60 * 60 * 24) * len(blocks_df) / len(cex_price_df)
+def swaps_and_arbitrages(
+    pool_model,
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+    gas=None,
+):
     """
-    ^-------parameter lambda for Poisson process, which can be thought 
-    as inverse of mean block time normalized in daily time.
+    (swaps, df) of one pool of any pool model (see pool_models.py).
+    """
+    return pools_swaps_and_arbitrages(
+        network,
+        base_token,
+        quote_token,
+        [(pool_model, dex, fee)],
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+        gas,
+    )[0]
+
+
+def pools_swaps_and_arbitrages(
+    network,
+    base_token,
+    quote_token,
+    pools,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+    gas=None,
+):
+    """
+    (swaps, df) of every pool of the ticker pair in (pools), a list of
+    (pool_model, dex, fee), e.g. [(CONSTANT_PRODUCT, "UNI_V2", 30),
+    (CONCENTRATED_LIQUIDITY, "UNI_V3", 30)].
+    The parameters are computed once for all the pools,
+    and the predictions once per fee.
+    gas: gas units of an arbitrage, pool_model.gas if not given.
     """
-    gamma = np.log(1 + fee / 10000)  # fee rate.
-    blocks_price["eta"] = (
-        np.sqrt(2 * blocks_price["lambda"])
-        * gamma
-        / np.sqrt(blocks_price["volSquared"])
-    )  # composite parameter.
-    blocks_price["tradeProbability"] = 1 / (1 + blocks_price["eta"])
-
     ############################################################
-    #                       Predictions                        #
+    #                    compute parameters                    #
     ############################################################
 
-    blocks_price["LVRperPoolValueRate"] = (
-        blocks_price["volSquared"] / 8 / blocks_price["lambda"]
-    )  # from MMRZ22, multiplied by avg block time (= inverse of lambda)
-    blocks_price["ARBperPoolValueRate"] = (
-        blocks_price["volSquared"]
-        / 8
-        * blocks_price["tradeProbability"]
-        * (
-            (np.exp(gamma / 2) + np.exp(-gamma / 2))
-            / (2 * (1 - blocks_price["volSquared"] / (8 * blocks_price["lambda"])))
-        )
-        / blocks_price["lambda"]
-    )  # from MMR23, multiplied by avg block time (= inverse of lambda)
-
-    blocks_price["expLVRperPoolValue"] = blocks_price["LVRperPoolValueRate"].cumsum()
-    blocks_price["expARBperPoolValue"] = blocks_price["ARBperPoolValueRate"].cumsum()
+    # shared by all the pools of the ticker pair
+    blocks_price = cex_parameters(
+        network,
+        base_token,
+        quote_token,
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+    )
 
     ############################################################
-    #                     Historical Data                      #
+    #                       Predictions                        #
     ############################################################
 
-    blocks_price_events = pd.merge(
-        blocks_price, events_df, on="blockNumber", how="left"
-    )
+    predictions = {}
+    for _, _, fee in pools:
+        if fee not in predictions:
+            predictions[fee] = compute_predictions(blocks_price, fee)
 
-    # fill the missing values of blocks without swaps
-    # forward fill
-    blocks_price_events["totalSupply"].ffill(inplace=True)
-    blocks_price_events["baseReserve"].ffill(inplace=True)
-    blocks_price_events["quoteReserve"].ffill(inplace=True)
-    # backward fill
-    blocks_price_events["totalSupply"].bfill(inplace=True)
-    blocks_price_events["baseReserve"].bfill(inplace=True)
-    blocks_price_events["quoteReserve"].bfill(inplace=True)
-    # empty swap values are filled with 0
-    blocks_price_events.fillna(0, inplace=True)
+    results = []
+    for pool_model, dex, fee in pools:
+        ############################################################
+        #                     Historical Data                      #
+        ############################################################
 
-    blocks_price_events["poolValue"] = 2 * np.sqrt(
-        blocks_price_events["quoteReserve"]
-        * blocks_price_events["baseReserve"]
-        * blocks_price_events["price"]
-    )  # this is immune to pool value manipulation from flashloan and sandwich attack
-    blocks_price_events["LVR"] = -(10000 - fee) / 10000 * (
-        blocks_price_events["baseIn"] * blocks_price_events["price"]
-        + blocks_price_events["quoteIn"]
-    ) + (
-        blocks_price_events["baseOut"] * blocks_price_events["price"]
-        + blocks_price_events["quoteOut"]
-    )  # LVR, which is equal to trader's PnL without swap fee and gas cost
-    blocks_price_events["FEE"] = (
-        fee
-        / 10000
-        * (
-            blocks_price_events["baseIn"] * blocks_price_events["price"]
-            + blocks_price_events["quoteIn"]
+        events_df = read_pool_events(
+            pool_model, network, dex, base_token, quote_token, fee, blocks_price
         )
-    )  # Fee income
-    if token_to_ticker(base_token) == "ETH":
-        """
-        (potential) arbitrage profit after swap fee and gas cost.
-        gas fee 140k (120k for V3) is selected from 5% percentile of gas
-        cost distribution, assuming that the arbitrageurs optimized their codes.
-        See https://twitter.com/atiselsts_eth/status/1719693946375258507
-        """
-        blocks_price_events["ARB"] = (
-            blocks_price_events["LVR"]
-            - blocks_price_events["FEE"]
-            - blocks_price_events["baseFeePerGas"]
-            * 140000
-            / 10**18
-            * blocks_price_events["price"]
-        )
-    else:
-        blocks_price_events["ARB"] = (
-            blocks_price_events["LVR"]
-            - blocks_price_events["FEE"]
-            - blocks_price_events["baseFeePerGas"] * 140000 / 10**18
+        blocks_price_events = add_historical_data(
+            pool_model, predictions[fee], events_df
         )
+        add_pnl(pool_model, blocks_price_events, base_token, fee, gas)
 
-    ############################################################
-    #                      Process data                        #
-    ############################################################
-    """
-    entire swap record for profit analysis. This contains retail orderflow too.
-    """
-    swaps = blocks_price_events[blocks_price_events["FEE"] > 0].copy()
-    swaps["swapSize"] = swaps["baseIn"] * swaps["price"] + swaps["quoteIn"]
+        ############################################################
+        #                      Process data                        #
+        ############################################################
 
-    """
-    arbitrage-only record. This is for error analysis between theory and real.
-    """
-    total_arb_per_block = blocks_price_events.groupby("blockNumber").sum()["ARB"]
-    mask = blocks_price_events["blockNumber"].isin(
-        list(total_arb_per_block[total_arb_per_block > 0.0].index)
-    )
-    arbitrages = blocks_price_events[mask]
-
-    df = pd.DataFrame(
-        columns=[
-            "timestamp",
-            "meanVolSquared",
-            "meanPoolValue",
-            "meanBaseFeePerGas",
-            "expectedLVRperPoolValue",  # for error analysis
-            "realizedLVRperPoolValue",  # for error analysis
-            "expectedARBperPoolValue",  # for error analysis
-            "realizedARBperPoolValueWithoutGas",  # for error analysis
-            "realizedARBperPoolValueWithGas",  # for error analysis
-        ]
-    )
+        results.append(process_data(pool_model, blocks_price_events, interval))
 
-    start_time = int(datetime(2023, 10, 1, tzinfo=timezone.utc).timestamp())
-    end_time = int(datetime(2023, 12, 1, tzinfo=timezone.utc).timestamp())
+    return results
 
-    while start_time < end_time:
-        blocks_price_events_in_interval = blocks_price_events[
-            (start_time <= blocks_price_events["timestamp"])
-            & (blocks_price_events["timestamp"] < start_time + interval)
-        ]
-        arbitrages_in_interval = arbitrages[
-            (start_time <= arbitrages["timestamp"])
-            & (arbitrages["timestamp"] < start_time + interval)
-        ]
-
-        new_row = pd.DataFrame(
-            [
-                [
-                    start_time,
-                    blocks_price_events_in_interval["volSquared"].mean(),
-                    blocks_price_events_in_interval["poolValue"].mean(),
-                    blocks_price_events_in_interval["baseFeePerGas"].mean(),
-                    blocks_price_events_in_interval["LVRperPoolValueRate"].sum(),
-                    (
-                        arbitrages_in_interval["LVR"]
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                    blocks_price_events_in_interval["ARBperPoolValueRate"].sum(),
-                    (
-                        (arbitrages_in_interval["LVR"] - arbitrages_in_interval["FEE"])
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                    (
-                        arbitrages_in_interval["ARB"]
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                ]
-            ],
-            columns=[
-                "timestamp",
-                "meanVolSquared",
-                "meanPoolValue",
-                "meanBaseFeePerGas",
-                "expectedLVRperPoolValue",
-                "realizedLVRperPoolValue",
-                "expectedARBperPoolValue",
-                "realizedARBperPoolValueWithoutGas",
-                "realizedARBperPoolValueWithGas",
-            ],
-        )
 
-        df = pd.concat([df, new_row], ignore_index=True)
+def compute_predictions(blocks_price_, fee):
+    """
+    parameters and theoretical predictions of the pools with (fee) bps fee rate.
+    """
+    blocks_price = blocks_price_.copy()
+    gamma = np.log(1 + fee / 10000)  # fee rate.
+    (blocks_price["eta"], blocks_price["tradeProbability"]) = trade_probability(
+        blocks_price["volSquared"], blocks_price["lambda"], gamma
+    )  # composite parameter, and probability of arbitrage in a block.
+
+    (
+        blocks_price["LVRperPoolValueRate"],
+        blocks_price["ARBperPoolValueRate"],
+    ) = prediction_rates(
+        blocks_price["volSquared"],
+        blocks_price["lambda"],
+        blocks_price["tradeProbability"],
+        gamma,
+    )  # from MMRZ22 and MMR23, multiplied by avg block time (= inverse of lambda)
 
-        start_time += interval
+    blocks_price["expLVRperPoolValue"] = blocks_price["LVRperPoolValueRate"].cumsum()
+    blocks_price["expARBperPoolValue"] = blocks_price["ARBperPoolValueRate"].cumsum()
 
-    return (swaps, df)
+    return blocks_price
 
 
-def v3_swaps_and_arbitrages(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
+def read_pool_events(
+    pool_model, network, dex, base_token, quote_token, fee, blocks_price
 ):
-    ############################################################
-    #                        read files                        #
-    ############################################################
-
-    events_df = pd.read_csv(
-        f"data/onchain_events/{network}_{dex}_{base_token}_{quote_token}_{fee}bps_events.csv"
-    )
-    events_df.rename(columns={"price": "ammPrice"}, inplace=True)
-    blocks_df = pd.read_csv(
-        f"data/{network}_blocks/blockNumber_timestamp_baseFeePerGas.csv"
-    )
-    cex_price_df = pd.read_csv(
-        f"data/cex_price/{token_to_ticker(base_token)}{token_to_ticker(quote_token)}_total.csv"
-    )
     """
-    For the case of Mainnet, we will refer the price 4 seconds before the block timestamp. 
-    This is when the block building auction ends usually.
-    It is also turned out that arbitrageurs get maximal profit if they execute 
-    the order at that moment. See 
-    https://ethresear.ch/t/empirical-analysis-of-cross-domain-cex-dex-arbitrage-on-ethereum/17620
+    events of the pool within the blocks of blocks_price.
     """
-    if network == "MAINNET":
-        cex_price_df["price"] = (
-            cex_price_df["price"].shift(4).fillna(cex_price_df["price"][0])
-        )
-
-    ############################################################
-    #                    compute parameters                    #
-    ############################################################
-
-    cex_price_df["return"] = (
-        cex_price_df["price"]
-        - cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    ) / cex_price_df["price"].shift(interval).fillna(
-        cex_price_df["price"][0]
-    )  # arithmetic return
-    cex_price_df["logReturn"] = np.log(
-        cex_price_df["price"]
-        / cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    )  # logarithmic return
-
-    if use_instant_volatility:
-        """
-        Instantaneous volatility from return.
-        For the derivation see http://dx.doi.org/10.3905/jpm.1994.409478
-        """
-        cex_price_df["volSquared"] = 2 * (
-            cex_price_df["return"] - cex_price_df["logReturn"]
-        )  # difference in arithmetic and logarithmic return
-    else:
-        """
-        Rolling volatility from logarithmic return.
-        We rollover (window) samples with step size being (interval).
-        """
-        cex_price_df["modulus"] = (
-            cex_price_df["timestamp"] - cex_price_df["timestamp"].min()
-        ) % interval
-
-        for i in range(interval):
-            # filter the indexes
-            mask = cex_price_df["modulus"] == i
-            masked_logReturns = cex_price_df.loc[mask, "logReturn"]
-
-            # j >= window
-            std_squared = masked_logReturns.rolling(window).std() ** 2
-            cex_price_df.loc[mask, "volSquared"] = std_squared
-
-            # 2 <= j < window
-            for j in range(2, window):
-                cex_price_df.loc[i + interval * (j - 1), "volSquared"] = (
-                    masked_logReturns[:j].std() ** 2
-                )
-
-            # j = 1: we use instantaneous volatility
-            cex_price_df.loc[i, "volSquared"] = 2 * (
-                cex_price_df.loc[i, "return"] - cex_price_df.loc[i, "logReturn"]
-            )
-    cex_price_df["volSquared"] *= (
-        60 * 60 * 24 / interval
-    )  # convert into daily timeframe.
+    return pool_model.read_events(
+        network,
+        dex,
+        base_token,
+        quote_token,
+        fee,
+        from_block=blocks_price["blockNumber"].min(),
+        to_block=blocks_price["blockNumber"].max(),
+    )
 
-    cex_price_df.fillna(0, inplace=True)
 
-    blocks_price = pd.merge(blocks_df, cex_price_df, on="timestamp", how="left")
-    blocks_price["lambda"] = (60 * 60 * 24) * len(blocks_df) / len(cex_price_df)
+def add_historical_data(pool_model, blocks_price, events_df):
     """
-    ^-------parameter lambda for Poisson process, which can be thought 
-    as inverse of mean block time normalized in daily time.
+    merge the events of the pool onto the blocks, and add the pool value.
     """
-    gamma = np.log(1 + fee / 10000)  # fee rate.
-    blocks_price["eta"] = (
-        np.sqrt(2 * blocks_price["lambda"])
-        * gamma
-        / np.sqrt(blocks_price["volSquared"])
-    )  # composite parameter.
-    blocks_price["tradeProbability"] = 1 / (1 + blocks_price["eta"])
-
-    ############################################################
-    #                       Predictions                        #
-    ############################################################
-
-    blocks_price["LVRperPoolValueRate"] = (
-        blocks_price["volSquared"] / 8 / blocks_price["lambda"]
-    )  # from MMRZ22, multiplied by avg block time (= inverse of lambda)
-    blocks_price["ARBperPoolValueRate"] = (
-        blocks_price["volSquared"]
-        / 8
-        * blocks_price["tradeProbability"]
-        * (
-            (np.exp(gamma / 2) + np.exp(-gamma / 2))
-            / (2 * (1 - blocks_price["volSquared"] / (8 * blocks_price["lambda"])))
-        )
-        / blocks_price["lambda"]
-    )  # from MMR23, multiplied by avg block time (= inverse of lambda)
-
-    blocks_price["expLVRperPoolValue"] = blocks_price["LVRperPoolValueRate"].cumsum()
-    blocks_price["expARBperPoolValue"] = blocks_price["ARBperPoolValueRate"].cumsum()
-
-    ############################################################
-    #                     Historical Data                      #
-    ############################################################
-
     blocks_price_events = pd.merge(
         blocks_price, events_df, on="blockNumber", how="left"
     )
 
     # fill the missing values of blocks without swaps
-    # forward fill
-    blocks_price_events["ammPrice"].ffill(inplace=True)
-    blocks_price_events["liquidity"].ffill(inplace=True)
-    # backward fill
-    blocks_price_events["ammPrice"].bfill(inplace=True)
-    blocks_price_events["liquidity"].bfill(inplace=True)
+    blocks_price_events[pool_model.state_columns] = (
+        blocks_price_events[pool_model.state_columns].ffill().bfill()
+    )
     # empty swap values are filled with 0
     blocks_price_events.fillna(0, inplace=True)
 
-    blocks_price_events["poolValue"] = (
-        2 * blocks_price_events["liquidity"] * np.sqrt(blocks_price_events["price"])
-    )
+    blocks_price_events["poolValue"] = pool_model.pool_value(blocks_price_events)
 
-    blocks_price_events["LVR"] = -(10000 - fee) / 10000 * (
-        blocks_price_events["baseAmount"].clip(lower=0.0) * blocks_price_events["price"]
-        + blocks_price_events["quoteAmount"].clip(lower=0.0)
-    ) - (
-        blocks_price_events["baseAmount"].clip(upper=0.0) * blocks_price_events["price"]
-        + blocks_price_events["quoteAmount"].clip(upper=0.0)
-    )  # LVR, which is equal to trader's PnL without swap fee and gas cost
-    blocks_price_events["FEE"] = (
-        fee
-        / 10000
-        * (
-            blocks_price_events["baseAmount"].clip(lower=0.0)
-            * blocks_price_events["price"]
-            + blocks_price_events["quoteAmount"].clip(lower=0.0)
-        )
-    )  # Fee income
-    if token_to_ticker(base_token) == "ETH":
-        """
-        (potential) arbitrage profit after swap fee and gas cost.
-        gas fee 140k (120k for V3) is selected from 5% percentile of gas
-        cost distribution, assuming that the arbitrageurs optimized their codes.
-        See https://twitter.com/atiselsts_eth/status/1719693946375258507
-        """
-        blocks_price_events["ARB"] = (
-            blocks_price_events["LVR"]
-            - blocks_price_events["FEE"]
-            - blocks_price_events["baseFeePerGas"]
-            * 120000
-            / 10**18
-            * blocks_price_events["price"]
-        )
-    else:
-        blocks_price_events["ARB"] = (
-            blocks_price_events["LVR"]
-            - blocks_price_events["FEE"]
-            - blocks_price_events["baseFeePerGas"] * 120000 / 10**18
-        )
+    return blocks_price_events
+
+
+def add_pnl(pool_model, blocks_price_events, base_token, fee, gas=None):
+    """
+    add the realized PnL of every swap, with (gas) units of gas per arbitrage.
+    """
+    (
+        blocks_price_events["LVR"],
+        blocks_price_events["FEE"],
+        blocks_price_events["ARB"],
+    ) = pool_model.pnl(
+        blocks_price_events, fee, token_to_ticker(base_token) == "ETH", gas
+    )  # LVR (trader's PnL without swap fee and gas cost), fee income, and ARB
+
+
+def process_data(pool_model, blocks_price_events, interval):
+    """
+    swap record and per interval summary of the pool.
+    """
+    # total ARB, number of swaps and sandwich-like pattern of every block
+    (
+        blocks_price_events["blockARB"],
+        blocks_price_events["swapsInBlock"],
+        blocks_price_events["sandwichLike"],
+    ) = classify_blocks(
+        blocks_price_events["blockNumber"],
+        blocks_price_events["ARB"],
+        pool_model.swap_direction(blocks_price_events),
+    )
 
-    ############################################################
-    #                      Process data                        #
-    ############################################################
     """
     entire swap record for profit analysis. This contains retail orderflow too.
     """
     swaps = blocks_price_events[blocks_price_events["FEE"] > 0].copy()
-    swaps["swapSize"] = swaps["baseAmount"].clip(lower=0.0) * swaps["price"] + swaps[
-        "quoteAmount"
-    ].clip(lower=0.0)
+    swaps["swapSize"] = pool_model.swap_size(swaps)
 
     """
-    arbitrage-only record. This is for error analysis between theory and real.
+    arbitrage-only record: the blocks with positive total arbitrage profit.
+    This is for error analysis between theory and real.
     """
-    total_arb_per_block = blocks_price_events.groupby("blockNumber").sum()["ARB"]
-    mask = blocks_price_events["blockNumber"].isin(
-        list(total_arb_per_block[total_arb_per_block > 0.0].index)
-    )
-    arbitrages = blocks_price_events[mask]
-
-    df = pd.DataFrame(
-        columns=[
-            "timestamp",
-            "meanVolSquared",
-            "meanPoolValue",
-            "meanBaseFeePerGas",
-            "expectedLVRperPoolValue",  # for error analysis
-            "realizedLVRperPoolValue",  # for error analysis
-            "expectedARBperPoolValue",  # for error analysis
-            "realizedARBperPoolValueWithoutGas",  # for error analysis
-            "realizedARBperPoolValueWithGas",  # for error analysis
-        ]
-    )
+    arbitrages = blocks_price_events[blocks_price_events["blockARB"] > 0.0]
 
     start_time = int(datetime(2023, 10, 1, tzinfo=timezone.utc).timestamp())
     end_time = int(datetime(2023, 12, 1, tzinfo=timezone.utc).timestamp())
-
-    while start_time < end_time:
-        blocks_price_events_in_interval = blocks_price_events[
-            (start_time <= blocks_price_events["timestamp"])
-            & (blocks_price_events["timestamp"] < start_time + interval)
-        ]
-        arbitrages_in_interval = arbitrages[
-            (start_time <= arbitrages["timestamp"])
-            & (arbitrages["timestamp"] < start_time + interval)
-        ]
-
-        new_row = pd.DataFrame(
-            [
-                [
-                    start_time,
-                    blocks_price_events_in_interval["volSquared"].mean(),
-                    blocks_price_events_in_interval["poolValue"].mean(),
-                    blocks_price_events_in_interval["baseFeePerGas"].mean(),
-                    blocks_price_events_in_interval["LVRperPoolValueRate"].sum(),
-                    (
-                        arbitrages_in_interval["LVR"]
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                    blocks_price_events_in_interval["ARBperPoolValueRate"].sum(),
-                    (
-                        (arbitrages_in_interval["LVR"] - arbitrages_in_interval["FEE"])
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                    (
-                        arbitrages_in_interval["ARB"]
-                        / arbitrages_in_interval["poolValue"]
-                    ).sum(),
-                ]
-            ],
-            columns=[
-                "timestamp",
-                "meanVolSquared",
-                "meanPoolValue",
-                "meanBaseFeePerGas",
-                "expectedLVRperPoolValue",
-                "realizedLVRperPoolValue",
-                "expectedARBperPoolValue",
-                "realizedARBperPoolValueWithoutGas",
-                "realizedARBperPoolValueWithGas",
-            ],
-        )
-
-        df = pd.concat([df, new_row], ignore_index=True)
-
-        start_time += interval
+    df = interval_summary(
+        blocks_price_events, arbitrages, start_time, end_time, interval
+    )
 
     return (swaps, df)
 
 
 ############################################################
-#                  TODO: modularization                    #
+#                     shared parameters                    #
 ############################################################
 
 
-def read_files(network, dex, base_token, quote_token, fee):
-    events_df = pd.read_csv(
-        f"data/onchain_events/{network}_{dex}_{base_token}_{quote_token}_{fee}bps_events.csv"
-    )
-    events_df.rename(columns={"price": "ammPrice"}, inplace=True)
-    blocks_df = pd.read_csv(
-        f"data/{network}_blocks/blockNumber_timestamp_baseFeePerGas.csv"
-    )
-    cex_price_df = pd.read_csv(
-        f"data/cex_price/{token_to_ticker(base_token)}{token_to_ticker(quote_token)}_total.csv"
+def read_blocks_and_cex_price(network, base_token, quote_token):
+    blocks_df = read_blocks(network)
+    blocks_df["l1DataFee"] = l1_data_fee(network, blocks_df["timestamp"])
+    cex_price_df = read_pair_prices(
+        token_to_ticker(base_token), token_to_ticker(quote_token)
     )
+
+    return (blocks_df, cex_price_df)
+
+
+def align_blocks(blocks_df, cex_price_df, latency):
     """
-    For the case of Mainnet, we will refer the price 4 seconds before the block timestamp. 
-    This is when the block building auction ends usually.
-    It is also turned out that arbitrageurs get maximal profit if they execute 
-    the order at that moment. See 
-    https://ethresear.ch/t/empirical-analysis-of-cross-domain-cex-dex-arbitrage-on-ethereum/17620
+    Join every block with the latest cex price row at or before
+    (timestamp - latency), by an as-of join (binary search) on the sorted timestamps.
+    A gap in the price feed carries the last price over, and the blocks before
+    the first price take the first price.
     """
-    if network == "MAINNET":
-        cex_price_df["price"] = (
-            cex_price_df["price"].shift(4).fillna(cex_price_df["price"][0])
-        )
+    cex_timestamp = np.maximum(
+        blocks_df["timestamp"] - latency, cex_price_df["timestamp"].iloc[0]
+    )
+    blocks_price = pd.merge_asof(
+        blocks_df.assign(cexTimestamp=cex_timestamp.astype(np.float64)),
+        cex_price_df.rename(columns={"timestamp": "cexTimestamp"}, copy=False).astype(
+            {"cexTimestamp": np.float64}
+        ),
+        on="cexTimestamp",
+        direction="backward",
+    )
+    return blocks_price.drop(columns="cexTimestamp")
+
 
-    return (events_df, blocks_df, cex_price_df)
+def cex_ticker(base_token, quote_token):
+    return f"{token_to_ticker(base_token)}{token_to_ticker(quote_token)}"
 
 
-def compute_parameters(
-    fee, use_instant_volatility, interval, window, blocks_df_, cex_price_df_
+def compute_cex_parameters(
+    use_instant_volatility, interval, window, blocks_df_, cex_price_df_, latency=0
 ):
+    """
+    the parameters which do not depend on the pool:
+    returns and volatility of the cex price, and lambda of the blocks.
+    Every block refers to the cex price (latency) seconds before it.
+    """
     cex_price_df = cex_price_df_.copy()
     blocks_df = blocks_df_.copy()
-    cex_price_df["return"] = (
-        cex_price_df["price"]
-        - cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    ) / cex_price_df["price"].shift(interval).fillna(
-        cex_price_df["price"][0]
-    )  # arithmetic return
-    cex_price_df["logReturn"] = np.log(
-        cex_price_df["price"]
-        / cex_price_df["price"].shift(interval).fillna(cex_price_df["price"][0])
-    )  # logarithmic return
+    (cex_price_df["return"], cex_price_df["logReturn"]) = lagged_returns(
+        cex_price_df["price"], interval
+    )  # arithmetic and logarithmic return
 
     if use_instant_volatility:
         """
@@ -624,120 +403,145 @@ def compute_parameters(
         cex_price_df["modulus"] = (
             cex_price_df["timestamp"] - cex_price_df["timestamp"].min()
         ) % interval
-
-        for i in range(interval):
-            # filter the indexes
-            mask = cex_price_df["modulus"] == i
-            masked_logReturns = cex_price_df.loc[mask, "logReturn"]
-
-            # j >= window
-            std_squared = masked_logReturns.rolling(window).std() ** 2
-            cex_price_df.loc[mask, "volSquared"] = std_squared
-
-            # 2 <= j < window
-            for j in range(2, window):
-                cex_price_df.loc[i + interval * (j - 1), "volSquared"] = (
-                    masked_logReturns[:j].std() ** 2
-                )
-
-            # j = 1: we use instantaneous volatility
-            cex_price_df.loc[i, "volSquared"] = 2 * (
-                cex_price_df.loc[i, "return"] - cex_price_df.loc[i, "logReturn"]
-            )
+        cex_price_df["volSquared"] = rolling_vol_squared(
+            cex_price_df["modulus"].to_numpy(),
+            cex_price_df["return"].to_numpy(),
+            cex_price_df["logReturn"].to_numpy(),
+            window,
+        )
     cex_price_df["volSquared"] *= (
         60 * 60 * 24 / interval
     )  # convert into daily timeframe.
 
     cex_price_df.fillna(0, inplace=True)
 
-    blocks_price = pd.merge(blocks_df, cex_price_df, on="timestamp", how="left")
+    blocks_price = align_blocks(blocks_df, cex_price_df, latency)
     blocks_price["lambda"] = (60 * 60 * 24) * len(blocks_df) / len(cex_price_df)
     """
     ^-------parameter lambda for Poisson process, which can be thought 
     as inverse of mean block time normalized in daily time.
     """
-    gamma = np.log(1 + fee / 10000)  # fee rate.
-    blocks_price["eta"] = (
-        np.sqrt(2 * blocks_price["lambda"])
-        * gamma
-        / np.sqrt(blocks_price["volSquared"])
-    )  # composite parameter.
-    blocks_price["tradeProbability"] = 1 / (1 + blocks_price["eta"])
 
     return (blocks_price, cex_price_df)
 
 
-def compute_predictions(
+def cex_parameters(
     network,
-    dex,
     base_token,
     quote_token,
-    fee,
     use_instant_volatility,
     interval,
     window,
-    events_df,
-    blocks_df,
-    cex_price_df,
+    latency=None,
 ):
-    pass
+    """
+    blocks_price of compute_cex_parameters, computed once per ticker pair and
+    parameters and shared by all pools (see parameter_cache.py).
+    """
+    latency = cex_latency(network, latency)
+    return cached_frame(
+        "cex_parameters",
+        [
+            *block_paths(network),
+            *gas_cost_paths(network),
+            *pair_price_paths(
+                token_to_ticker(base_token), token_to_ticker(quote_token)
+            ),
+        ],
+        cex_parameters_params(
+            network,
+            base_token,
+            quote_token,
+            use_instant_volatility,
+            interval,
+            window,
+            latency,
+        ),
+        lambda: compute_cex_parameters(
+            use_instant_volatility,
+            interval,
+            window,
+            *read_blocks_and_cex_price(network, base_token, quote_token),
+            latency,
+        )[0],
+    )
 
 
-def add_historical_data(
+def cex_parameters_params(
     network,
-    dex,
     base_token,
     quote_token,
-    fee,
     use_instant_volatility,
     interval,
     window,
-    events_df,
-    blocks_df,
-    cex_price_df,
+    latency=None,
 ):
-    pass
-
+    """
+    params of the cache key of cex_parameters. A pair and its inverse are
+    read from the same files, so the ticker pair is a part of the params.
+    """
+    return [
+        network,
+        cex_ticker(base_token, quote_token),
+        use_instant_volatility,
+        interval,
+        window,
+        cex_latency(network, latency),
+        L1_DATA_UNITS,
+    ]
+
+
+def interval_summary(blocks_price_events, arbitrages, start_time, end_time, interval):
+    """
+    One row of INTERVAL_COLUMNS per (interval) seconds from start_time to end_time.
+    Every row of the two frames goes to the bucket (timestamp - start_time) // interval,
+    and the sums and means of all buckets are taken with one bincount per column.
+    The mean of an empty bucket is NaN and its sum is 0, as with pandas.
+    """
+    n_buckets = -(-(end_time - start_time) // interval)
+
+    def bucket_sums(df, values):
+        buckets = (df["timestamp"].to_numpy().astype(np.int64) - start_time) // interval
+        values = np.asarray(values, dtype=np.float64)
+        mask = (0 <= buckets) & (buckets < n_buckets) & ~np.isnan(values)
+        return (
+            np.bincount(buckets[mask], weights=values[mask], minlength=n_buckets),
+            np.bincount(buckets[mask], minlength=n_buckets),
+        )
 
-def v2_swaps(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
-):
-    (events_df, blocks_df, cex_price_df) = read_files(
-        network, dex, base_token, quote_token, fee
+    def bucket_means(df, values):
+        (sums, counts) = bucket_sums(df, values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return sums / counts
+
+    return pd.DataFrame(
+        {
+            "timestamp": start_time + interval * np.arange(n_buckets),
+            "meanVolSquared": bucket_means(
+                blocks_price_events, blocks_price_events["volSquared"]
+            ),
+            "meanPoolValue": bucket_means(
+                blocks_price_events, blocks_price_events["poolValue"]
+            ),
+            "meanBaseFeePerGas": bucket_means(
+                blocks_price_events, blocks_price_events["baseFeePerGas"]
+            ),
+            "expectedLVRperPoolValue": bucket_sums(
+                blocks_price_events, blocks_price_events["LVRperPoolValueRate"]
+            )[0],
+            "realizedLVRperPoolValue": bucket_sums(
+                arbitrages, arbitrages["LVR"] / arbitrages["poolValue"]
+            )[0],
+            "expectedARBperPoolValue": bucket_sums(
+                blocks_price_events, blocks_price_events["ARBperPoolValueRate"]
+            )[0],
+            "realizedARBperPoolValueWithoutGas": bucket_sums(
+                arbitrages,
+                (arbitrages["LVR"] - arbitrages["FEE"]) / arbitrages["poolValue"],
+            )[0],
+            "realizedARBperPoolValueWithGas": bucket_sums(
+                arbitrages, arbitrages["ARB"] / arbitrages["poolValue"]
+            )[0],
+        },
+        columns=INTERVAL_COLUMNS,
     )
-    (blocks_price, cex_price_df) = compute_parameters(
-        fee, use_instant_volatility, interval, window, blocks_df, cex_price_df
-    )
-    compute_predictions()
-    add_historical_data()
-    # filter swaps
-
-
-def v2_arbitrages(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
-):
-    read_files()
-    compute_parameters()
-    compute_predictions()
-    add_historical_data()
-    # filter arbitrages
-
-
-def v3_swaps(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
-):
-    read_files()
-    compute_parameters()
-    compute_predictions()
-    add_historical_data()
-    # filter swaps
-
-
-def v3_arbitrages(
-    network, dex, base_token, quote_token, fee, use_instant_volatility, interval, window
-):
-    read_files()
-    compute_parameters()
-    compute_predictions()
-    add_historical_data()
-    # filter arbitrages
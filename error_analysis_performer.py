@@ -13,6 +13,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 from utils import *
 import data_processor
+import pool_executor
+import parameter_sweep
+from pool_models import CONSTANT_PRODUCT, CONCENTRATED_LIQUIDITY
 
 load_dotenv()
 
@@ -45,32 +48,21 @@ def compare_lvr_theory_real(
     v3_arbs_list = []
     v2_arbs_list = []
     xticks = []
-    for quote_token in quote_tokens:
-        for fee in fees:
-            if fee == 30:
-                (v2_swaps, v2_arbs) = data_processor.v2_swaps_and_arbitrages(
-                    network,
-                    v2_dex,
-                    "WETH",
-                    quote_token,
-                    fee,
-                    use_instant_volatility,
-                    interval,
-                    window,
-                )
-                v2_arbs_list.append(v2_arbs)
-
-            (v3_swaps, v3_arbs) = data_processor.v3_swaps_and_arbitrages(
-                network,
-                "UNI_V3",
-                "WETH",
-                quote_token,
-                fee,
-                use_instant_volatility,
-                interval,
-                window,
-            )
-            v3_arbs_list.append(v3_arbs)
+    # the V2 pool and the V3 pools on the same price and volatility
+    tasks = [
+        (pool_model, dex, "WETH", quote_token, fee)
+        for quote_token in quote_tokens
+        for pool_model, dex, fee in [(CONSTANT_PRODUCT, v2_dex, 30)]
+        + [(CONCENTRATED_LIQUIDITY, "UNI_V3", fee) for fee in fees]
+    ]
+    results = pool_executor.evaluate_pools(
+        network, tasks, use_instant_volatility, interval, window
+    )
+    for (pool_model, _, _, quote_token, fee), (swaps, arbs) in zip(tasks, results):
+        if pool_model is CONSTANT_PRODUCT:
+            v2_arbs_list.append(arbs)
+        else:
+            v3_arbs_list.append(arbs)
             xticks.append(f"{quote_token}-{fee}")
 
     ############################################################
@@ -224,12 +216,59 @@ def compare_lvr_theory_real(
     )
 
 
-def compare_volatility():
+def compare_volatility(
+    network,
+    v2_dex,
+    intervals,
+    windows,
+):
     """
     This will be added in appendix.
     show that volatility is consistent across the various combinations of interval and window.
     """
-    pass
+    ############################################################
+    #                         load data                        #
+    ############################################################
+
+    results = parameter_sweep.sweep(
+        network,
+        "WETH",
+        "USDC",
+        [(CONSTANT_PRODUCT, v2_dex, 30)],
+        intervals,
+        windows,
+    )
+    vol_squared = results[results["metric"] == "meanVolSquared"].dropna(subset="value")
+    groups = list(vol_squared.groupby(["interval", "window"])["value"])
+    xticks = list(range(1, len(groups) + 1))
+
+    ############################################################
+    #                         plot data                        #
+    ############################################################
+
+    # daily volatility boxplot
+    plt.figure(figsize=(len(xticks), 10))
+    plt.scatter(
+        xticks,
+        [np.sqrt(values).mean() * 100 for _, values in groups],
+        label="mean",
+        marker="x",
+    )
+    plt.boxplot(
+        [np.sqrt(values) * 100 for _, values in groups],
+        showfliers=False,
+    )
+    plt.xticks(
+        xticks,
+        [f"{interval}s-{int(window)}" for (interval, window), _ in groups],
+        rotation=45,
+    )
+    plt.title("daily volatility of ETH-USD for various interval and window")
+    plt.ylabel("%")
+    plt.legend()
+    plt.savefig(
+        f"results/vol_{network}_WETH_USDC_boxplot.png",
+    )
 
 
 if __name__ == "__main__":
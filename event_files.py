@@ -0,0 +1,156 @@
+"""
+processed events of every pool as a Parquet dataset.
+
+data/onchain_events/network={network}/dex={dex}/pair={base}_{quote}[/fee={bps}]/
+    blockRange={start}/part-0.parquet    rows with start <= blockNumber < start + BLOCK_RANGE_SIZE
+
+Row groups carry min/max statistics of blockNumber, so a block range filter
+skips whole files and row groups without decoding them.
+The csv files of the earlier getters are still read when a pool has no dataset yet.
+"""
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import polars as pl
+
+EVENTS_PATH = "data/onchain_events"
+BLOCK_RANGE_SIZE = 1_000_000
+ROW_GROUP_SIZE = 100_000
+
+# columns of the onchain events used by the analysis
+V2_EVENT_COLUMNS = [
+    "blockNumber",
+    "baseIn",
+    "quoteIn",
+    "baseOut",
+    "quoteOut",
+    "totalSupply",
+    "baseReserve",
+    "quoteReserve",
+]
+V3_EVENT_COLUMNS = [
+    "blockNumber",
+    "baseAmount",
+    "quoteAmount",
+    "price",
+    "liquidity",
+    "tick",
+]
+
+
+def events_path(network, dex, base_token, quote_token, fee=None):
+    path = f"{EVENTS_PATH}/network={network}/dex={dex}/pair={base_token}_{quote_token}"
+    if fee is not None:
+        path += f"/fee={fee}"
+    return path
+
+
+def legacy_events_path(network, dex, base_token, quote_token, fee=None):
+    if fee is None:
+        return f"{EVENTS_PATH}/{network}_{dex}_{base_token}_{quote_token}_events.csv"
+    return (
+        f"{EVENTS_PATH}/{network}_{dex}_{base_token}_{quote_token}_{fee}bps_events.csv"
+    )
+
+
+def write_events(df, network, dex, base_token, quote_token, fee=None):
+    """
+    Replace the dataset of the pool by (df), partitioned by block range.
+    """
+    path = events_path(network, dex, base_token, quote_token, fee)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+
+    df = df.reset_index(drop=True)
+    block_ranges = df["blockNumber"] // BLOCK_RANGE_SIZE * BLOCK_RANGE_SIZE
+    for block_range, indexes in df.groupby(block_ranges).groups.items():
+        os.makedirs(f"{path}/blockRange={block_range}", exist_ok=True)
+        pq.write_table(
+            pa.Table.from_pandas(df.loc[indexes], preserve_index=False),
+            f"{path}/blockRange={block_range}/part-0.parquet",
+            row_group_size=ROW_GROUP_SIZE,
+            write_statistics=True,
+        )
+
+
+def read_events(
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee=None,
+    columns=None,
+    from_block=None,
+    to_block=None,
+):
+    """
+    Read the (columns) of the events of a pool, with from_block <= blockNumber <= to_block.
+    Only the requested columns are decoded, and the block range is pushed down
+    to the block range partitions and the row group statistics.
+    """
+    path = events_path(network, dex, base_token, quote_token, fee)
+    if not os.path.exists(path):
+        return _read_legacy_events(
+            legacy_events_path(network, dex, base_token, quote_token, fee),
+            columns,
+            from_block,
+            to_block,
+        )
+
+    block_filter = None
+    if from_block is not None:
+        block_filter = (ds.field("blockRange") > from_block - BLOCK_RANGE_SIZE) & (
+            ds.field("blockNumber") >= from_block
+        )
+    if to_block is not None:
+        to_filter = (ds.field("blockRange") <= to_block) & (
+            ds.field("blockNumber") <= to_block
+        )
+        block_filter = to_filter if block_filter is None else block_filter & to_filter
+
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("blockRange", pa.int64())]), flavor="hive"
+        ),
+    )
+    df = dataset.to_table(
+        columns=columns
+        or [name for name in dataset.schema.names if name != "blockRange"],
+        filter=block_filter,
+    ).to_pandas()
+
+    # the block range partitions are not listed in numerical order
+    return df.sort_values(
+        by=[column for column in ["blockNumber", "logIndex"] if column in df.columns],
+        kind="stable",
+        ignore_index=True,
+    )
+
+
+def scan_events(network, dex, base_token, quote_token, fee=None, columns=None):
+    """
+    polars LazyFrame of the (columns) of the events of a pool, sorted by blockNumber.
+    """
+    path = events_path(network, dex, base_token, quote_token, fee)
+    if os.path.exists(path):
+        lf = pl.scan_parquet(f"{path}/*/*.parquet", hive_partitioning=False)
+    else:
+        lf = pl.scan_csv(legacy_events_path(network, dex, base_token, quote_token, fee))
+    if columns is not None:
+        lf = lf.select(columns)
+    # the block range partitions are not listed in numerical order
+    return lf.sort("blockNumber", maintain_order=True)
+
+
+def _read_legacy_events(path, columns, from_block, to_block):
+    df = pd.read_csv(path, usecols=columns)
+    if from_block is not None:
+        df = df[df["blockNumber"] >= from_block]
+    if to_block is not None:
+        df = df[df["blockNumber"] <= to_block]
+    return df.reset_index(drop=True)
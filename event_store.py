@@ -0,0 +1,119 @@
+"""
+append-only, checkpointed store of the decoded event logs of a pool.
+
+data/onchain_events/raw/{name}/
+    checkpoint.json                 fromBlock and the last contiguous completed block
+    {table}/initial.csv             pool state right before fromBlock
+    {table}/{start}_{end}.csv       rows of one completed chunk
+"""
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+from fixed_point import integer_dtypes
+
+STORE_PATH = "data/onchain_events/raw"
+
+
+class EventStore:
+    def __init__(self, name):
+        self.name = name
+        self.path = f"{STORE_PATH}/{name}"
+        self.checkpoint_path = f"{self.path}/checkpoint.json"
+        self.completed = {}  # chunks completed beyond the checkpoint
+
+    def open(self, from_block):
+        """
+        Create the store or resume it, and return the first block to fetch.
+        Chunks which were completed beyond the checkpoint of an interrupted
+        run are dropped, since their range may not match the next run.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            os.makedirs(self.path, exist_ok=True)
+            self.checkpoint = {"fromBlock": from_block, "lastBlock": from_block - 1}
+            self._save_checkpoint()
+            return from_block
+
+        with open(self.checkpoint_path) as f:
+            self.checkpoint = json.load(f)
+        if self.checkpoint["fromBlock"] != from_block:
+            raise ValueError(
+                f"{self.path} starts at block {self.checkpoint['fromBlock']}, "
+                f"not {from_block}. Remove it to backfill from another start."
+            )
+        for chunk_path in glob.glob(f"{self.path}/*/*_*.csv"):
+            chunk_start = int(os.path.basename(chunk_path).split("_")[0])
+            if chunk_start > self.checkpoint["lastBlock"]:
+                os.remove(chunk_path)
+        print(f"Resuming from block {self.checkpoint['lastBlock'] + 1}..")
+        return self.checkpoint["lastBlock"] + 1
+
+    def has_initial(self):
+        return bool(glob.glob(f"{self.path}/*/initial.csv"))
+
+    def write_initial(self, tables):
+        self._write_tables("initial", tables)
+
+    def write_chunk(self, chunk_start, chunk_end, tables):
+        """
+        Persist the rows of one chunk, then move the checkpoint forward
+        over every chunk which is now contiguous with it.
+        """
+        self._write_tables(f"{chunk_start:012d}_{chunk_end:012d}", tables)
+        self.completed[chunk_start] = chunk_end
+        while self.checkpoint["lastBlock"] + 1 in self.completed:
+            self.checkpoint["lastBlock"] = self.completed.pop(
+                self.checkpoint["lastBlock"] + 1
+            )
+        self._save_checkpoint()
+
+    def read_table(self, table, integers, from_block, to_block):
+        """
+        rows of the table with from_block <= blockNumber < to_block, in block order.
+        The store may hold chunks beyond to_block from an earlier, longer run,
+        so only the chunks overlapping the range are read.
+        integer values are kept exact as limb columns (see fixed_point.py).
+        (integers) is the integer type of every integer column, e.g.
+        log_decoder.V2_PAIR_TABLES["swaps"], which also gives the columns
+        of a table without any row.
+        """
+        dtypes = {
+            "blockNumber": np.int64,
+            "logIndex": np.int64,
+            **integer_dtypes(integers),
+        }
+        table_path = f"{self.path}/{table}"
+        paths = []
+        for chunk_path in sorted(glob.glob(f"{table_path}/*_*.csv")):
+            file_name = os.path.splitext(os.path.basename(chunk_path))[0]
+            (chunk_start, chunk_end) = map(int, file_name.split("_"))
+            if chunk_end >= from_block and chunk_start < to_block:
+                paths.append(chunk_path)
+        if os.path.exists(f"{table_path}/initial.csv"):
+            paths = [f"{table_path}/initial.csv"] + paths
+        dfs = [pd.read_csv(path, dtype=dtypes) for path in paths]
+        if not dfs:
+            return pd.DataFrame(
+                {column: np.empty(0, dtype=dtype) for column, dtype in dtypes.items()}
+            )
+        df = pd.concat(dfs, ignore_index=True)
+        return df[
+            (df["blockNumber"] >= from_block) & (df["blockNumber"] < to_block)
+        ].reset_index(drop=True)
+
+    def _write_tables(self, file_name, tables):
+        for table, columns in tables.items():
+            df = pd.DataFrame(columns)
+            if len(df) == 0:
+                continue
+            os.makedirs(f"{self.path}/{table}", exist_ok=True)
+            tmp_path = f"{self.path}/{table}/{file_name}.tmp"
+            df.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, f"{self.path}/{table}/{file_name}.csv")
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f, indent=4)
+        os.replace(tmp_path, self.checkpoint_path)
@@ -0,0 +1,145 @@
+"""
+exact on-chain integers as int64 limb columns, with float64 views on demand.
+
+An integer column (name) of n limbs is stored as
+    {name}_limb0, ..., {name}_limb{n-2}    uint64, least significant first
+    {name}_limb{n-1}                       most significant, int64 (two's complement)
+                                           for a signed column, uint64 for an unsigned one
+so that value = sum(limb_i * 2**(64 * i)).
+
+The layout of a column is given by an integer type (see integer_layout):
+    "int128"    2 limbs, -2**127 <= value < 2**127
+    "uint128"   2 limbs, 0 <= value < 2**128 (liquidity, reserves, V2 amounts)
+    "uint192"   3 limbs, 0 <= value < 2**192 (sqrtPriceX96)
+    "int64"     a plain int64 column without limbs (tick)
+"""
+import re
+import numpy as np
+import pandas as pd
+
+LIMB_BITS = 64
+LIMB_MASK = 2**LIMB_BITS - 1
+
+
+def integer_layout(integer_type):
+    """
+    (n_limbs, unsigned) of an integer type such as "int128" or "uint192".
+    """
+    match = re.fullmatch(r"(u?)int(\d+)", integer_type)
+    return (int(match[2]) // LIMB_BITS, match[1] == "u")
+
+
+def limb_columns(name, values, n_limbs=2, unsigned=False):
+    """
+    split python integers into the limb columns of (name).
+    """
+    values = [int(value) for value in values]
+    bound = 2 ** (LIMB_BITS * n_limbs)
+    (low, high) = (0, bound) if unsigned else (-bound // 2, bound // 2)
+    if any(value < low or value >= high for value in values):
+        raise OverflowError(f"{name} does not fit in {n_limbs} limbs")
+
+    columns = {
+        f"{name}_limb{i}": np.array(
+            [(value >> (LIMB_BITS * i)) & LIMB_MASK for value in values],
+            dtype=np.uint64,
+        )
+        for i in range(n_limbs - 1)
+    }
+    columns[f"{name}_limb{n_limbs - 1}"] = np.array(
+        [value >> (LIMB_BITS * (n_limbs - 1)) for value in values],
+        dtype=np.uint64 if unsigned else np.int64,
+    )
+    return columns
+
+
+def limb_names(df, name):
+    return sorted(
+        [column for column in df.columns if re.fullmatch(f"{name}_limb\\d+", column)],
+        key=lambda column: int(column.rsplit("_limb", 1)[1]),
+    )
+
+
+def integer_dtypes(integers):
+    """
+    dtypes of the columns of (integers), a dict of the integer type
+    of every integer column, e.g. for pd.read_csv.
+    """
+    dtypes = {}
+    for name, integer_type in integers.items():
+        if integer_type == "int64":
+            dtypes[name] = np.int64
+            continue
+        (n_limbs, unsigned) = integer_layout(integer_type)
+        for i in range(n_limbs - 1):
+            dtypes[f"{name}_limb{i}"] = np.uint64
+        dtypes[f"{name}_limb{n_limbs - 1}"] = np.uint64 if unsigned else np.int64
+    return dtypes
+
+
+def to_float(df, name):
+    """
+    float64 view of the integer column (name).
+    Negative values are negated in limb space first, so that small negative
+    values do not cancel out between the limbs. A column is unsigned if its
+    most significant limb is uint64.
+    """
+    names = limb_names(df, name)
+    limbs = [df[column].to_numpy().astype(np.uint64) for column in names]
+    if df[names[-1]].dtype == np.uint64:
+        negative = np.zeros(len(df), dtype=bool)
+    else:
+        negative = df[names[-1]].to_numpy() < 0
+
+    values = np.zeros(len(df))
+    for i, limb in enumerate(negate_limbs(limbs, negative)):
+        values += limb.astype(np.float64) * 2.0 ** (LIMB_BITS * i)
+    return pd.Series(np.where(negative, -values, values), index=df.index)
+
+
+def negate_limbs(limbs, mask):
+    """
+    two's complement negation of the values selected by (mask):
+    invert every limb, then add one with carry.
+    limbs are uint64 arrays, least significant first.
+    """
+    carry = mask.astype(np.uint64)
+    negated = []
+    for limb in limbs:
+        limb = np.where(mask, ~limb, limb) + carry
+        carry = carry & (limb == 0)
+        negated.append(limb)
+    return negated
+
+
+def columns_from_limbs(name, limbs, unsigned=False):
+    """
+    limb columns of (name) from uint64 arrays, least significant first.
+    """
+    columns = {f"{name}_limb{i}": limb for i, limb in enumerate(limbs[:-1])}
+    columns[f"{name}_limb{len(limbs) - 1}"] = (
+        limbs[-1] if unsigned else limbs[-1].view(np.int64)
+    )
+    return columns
+
+
+def to_int(df, name):
+    """
+    exact python integers of the integer column (name), as an object Series.
+    """
+    return sum(
+        df[column].map(int) * 2 ** (LIMB_BITS * i)
+        for i, column in enumerate(limb_names(df, name))
+    )
+
+
+def scale_columns(df, decimals):
+    """
+    Replace the limb columns of every name in (decimals) by its float64 view
+    divided by 10**decimals.
+    """
+    for name, d in decimals.items():
+        values = to_float(df, name) / 10**d
+        df.drop(columns=limb_names(df, name), inplace=True)
+        df[name] = values
+    return df
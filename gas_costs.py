@@ -0,0 +1,58 @@
+"""
+gas cost of an arbitrage in every block, in wei, for the PnL of pool_models.py:
+
+    MAINNET    gas * baseFeePerGas
+    ARBITRUM   gas * baseFeePerGas + l1DataFee
+
+A transaction on Arbitrum pays the L2 base fee of its block for its L2 gas, and
+the cost of posting its data to Ethereum: the L1 price per unit times 16 units per
+byte of its compressed size (https://docs.arbitrum.io/how-arbitrum-works/gas-fees).
+The L1 price follows the base fee of Ethereum, so it is taken from the mainnet blocks
+(see blocks_formatter.py) at the timestamp of every block.
+"""
+import numpy as np
+from utils import block_paths, read_blocks
+
+L1_NETWORKS = {"ARBITRUM": "MAINNET"}  # networks posting their data to Ethereum
+# L1 data units of an arbitrage: 16 per byte of a swap transaction of about
+# 200 bytes after compression.
+L1_DATA_UNITS = 16 * 200
+L1_BLOCK_TIME = (
+    12  # seconds, the last L1 block still covers the blocks this soon after it
+)
+
+
+def l1_data_fee(network, timestamp):
+    """
+    L1 data fee in wei of an arbitrage in the blocks at (timestamp), 0 on Ethereum.
+    Raise ValueError if the L1 blocks do not cover (timestamp).
+    """
+    timestamp = np.asarray(timestamp)
+    if network not in L1_NETWORKS:
+        return np.zeros(len(timestamp))
+
+    l1_network = L1_NETWORKS[network]
+    l1_blocks = read_blocks(l1_network, ["timestamp", "baseFeePerGas"])
+    l1_timestamp = l1_blocks["timestamp"].to_numpy()
+    if len(timestamp) > 0 and (
+        timestamp.min() < l1_timestamp[0]
+        or timestamp.max() > l1_timestamp[-1] + L1_BLOCK_TIME
+    ):
+        raise ValueError(
+            f"{network}: blocks at {timestamp.min()}..{timestamp.max()} are outside "
+            f"the {l1_network} blocks at {l1_timestamp[0]}..{l1_timestamp[-1]}, "
+            f"run blocks_formatter.py over the {l1_network} blocks of the period."
+        )
+    # the base fee of the latest L1 block at or before every block
+    i = np.searchsorted(l1_timestamp, timestamp, side="right")
+    l1_base_fee = l1_blocks["baseFeePerGas"].to_numpy(dtype=np.float64)
+    return L1_DATA_UNITS * l1_base_fee[i - 1]
+
+
+def gas_cost_paths(network):
+    """
+    files the gas cost of the network is read from, besides its own blocks.
+    """
+    if network not in L1_NETWORKS:
+        return []
+    return block_paths(L1_NETWORKS[network])
@@ -0,0 +1,509 @@
+"""
+compiled kernels for the per-row computations of data_processor.py.
+
+Every kernel has a numba version (a plain loop over the rows) and a NumPy
+version with the same floating point operations; the numba one is used
+whenever numba is installed. tests/test_kernels.py checks that both agree,
+and running this file compares their run times.
+"""
+import time
+import numpy as np
+from volatility import rolling_vol_squared as _rolling_vol_squared_numpy
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+    jit = njit(cache=True, nogil=True, error_model="numpy")
+except ImportError:
+    NUMBA_AVAILABLE = False
+    jit = lambda function: function
+
+
+############################################################
+#                         returns                          #
+############################################################
+
+
+@jit
+def _lagged_returns_numba(price, interval):
+    returns = np.empty(len(price))
+    log_returns = np.empty(len(price))
+    for k in range(len(price)):
+        lagged_price = price[k - interval] if k >= interval else price[0]
+        returns[k] = (price[k] - lagged_price) / lagged_price
+        log_returns[k] = np.log(price[k] / lagged_price)
+    return (returns, log_returns)
+
+
+def _lagged_returns_numpy(price, interval):
+    lagged_price = np.full(len(price), price[0])
+    lagged_price[interval:] = price[: len(price) - interval]
+    return ((price - lagged_price) / lagged_price, np.log(price / lagged_price))
+
+
+def lagged_returns(price, interval):
+    """
+    arithmetic and logarithmic return over (interval) rows.
+    The first (interval) rows are compared against the first price.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    if NUMBA_AVAILABLE:
+        return _lagged_returns_numba(price, interval)
+    return _lagged_returns_numpy(price, interval)
+
+
+############################################################
+#                    rolling volatility                    #
+############################################################
+
+
+@jit
+def _phase_variance_numba(x, starts, counts, window):
+    variance = np.empty(len(x))
+    for phase in range(len(starts)):
+        start = starts[phase]
+        count = counts[phase]
+        # center the phase on its mean, as volatility.rolling_vol_squared does
+        mean = 0.0
+        for k in range(start, start + count):
+            mean += x[k]
+        mean /= count
+
+        window_sum = 0.0
+        window_squared_sum = 0.0
+        for j in range(count):
+            d = x[start + j] - mean
+            window_sum += d
+            window_squared_sum += d * d
+            if j >= window:
+                d = x[start + j - window] - mean
+                window_sum -= d
+                window_squared_sum -= d * d
+            m = min(j + 1, window)
+            if m > 1:
+                v = (window_squared_sum - window_sum * window_sum / m) / (m - 1)
+                variance[start + j] = v if v > 0.0 else 0.0
+            else:
+                variance[start + j] = np.nan
+    return variance
+
+
+def rolling_vol_squared(modulus, returns, log_returns, window):
+    """
+    see volatility.rolling_vol_squared.
+    """
+    if not NUMBA_AVAILABLE:
+        return _rolling_vol_squared_numpy(modulus, returns, log_returns, window)
+
+    n = len(modulus)
+    order = np.argsort(modulus, kind="stable")
+    phases = np.asarray(modulus)[order]
+    starts = np.flatnonzero(np.r_[True, phases[1:] != phases[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    variance = _phase_variance_numba(
+        np.asarray(log_returns, dtype=np.float64)[order], starts, counts, window
+    )
+
+    # j = 1: we use instantaneous volatility
+    first = order[starts]
+    vol_squared = np.empty(n)
+    vol_squared[order] = variance
+    vol_squared[first] = 2 * (
+        np.asarray(returns, dtype=np.float64)[first]
+        - np.asarray(log_returns, dtype=np.float64)[first]
+    )
+    return vol_squared
+
+
+############################################################
+#                       predictions                        #
+############################################################
+
+
+@jit
+def _trade_probability_numba(vol_squared, lam, gamma):
+    eta = np.empty(len(vol_squared))
+    trade_probability = np.empty(len(vol_squared))
+    for k in range(len(vol_squared)):
+        eta[k] = np.sqrt(2 * lam[k]) * gamma / np.sqrt(vol_squared[k])
+        trade_probability[k] = 1 / (1 + eta[k])
+    return (eta, trade_probability)
+
+
+def _trade_probability_numpy(vol_squared, lam, gamma):
+    eta = np.sqrt(2 * lam) * gamma / np.sqrt(vol_squared)
+    return (eta, 1 / (1 + eta))
+
+
+def trade_probability(vol_squared, lam, gamma):
+    """
+    composite parameter eta and the probability that a block has an arbitrage.
+    """
+    (vol_squared, lam) = _float_arrays(vol_squared, lam)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if NUMBA_AVAILABLE:
+            return _trade_probability_numba(vol_squared, lam, gamma)
+        return _trade_probability_numpy(vol_squared, lam, gamma)
+
+
+@jit
+def _prediction_rates_numba(vol_squared, lam, trade_probability, gamma):
+    lvr_rate = np.empty(len(vol_squared))
+    arb_rate = np.empty(len(vol_squared))
+    for k in range(len(vol_squared)):
+        lvr_rate[k] = vol_squared[k] / 8 / lam[k]
+        arb_rate[k] = (
+            vol_squared[k]
+            / 8
+            * trade_probability[k]
+            * (
+                (np.exp(gamma / 2) + np.exp(-gamma / 2))
+                / (2 * (1 - vol_squared[k] / (8 * lam[k])))
+            )
+            / lam[k]
+        )
+    return (lvr_rate, arb_rate)
+
+
+def _prediction_rates_numpy(vol_squared, lam, trade_probability, gamma):
+    lvr_rate = vol_squared / 8 / lam
+    arb_rate = (
+        vol_squared
+        / 8
+        * trade_probability
+        * (
+            (np.exp(gamma / 2) + np.exp(-gamma / 2))
+            / (2 * (1 - vol_squared / (8 * lam)))
+        )
+        / lam
+    )
+    return (lvr_rate, arb_rate)
+
+
+def prediction_rates(vol_squared, lam, trade_probability, gamma):
+    """
+    expected LVR (MMRZ22) and arbitrage profit (MMR23) per pool value,
+    multiplied by avg block time (= inverse of lambda).
+    """
+    (vol_squared, lam, trade_probability) = _float_arrays(
+        vol_squared, lam, trade_probability
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if NUMBA_AVAILABLE:
+            return _prediction_rates_numba(vol_squared, lam, trade_probability, gamma)
+        return _prediction_rates_numpy(vol_squared, lam, trade_probability, gamma)
+
+
+############################################################
+#                      realized PnL                        #
+############################################################
+
+
+@jit
+def _v2_pnl_numba(
+    base_in,
+    quote_in,
+    base_out,
+    quote_out,
+    price,
+    base_fee,
+    l1_fee,
+    fee,
+    gas,
+    is_eth_base,
+):
+    lvr = np.empty(len(price))
+    fee_income = np.empty(len(price))
+    arb = np.empty(len(price))
+    for k in range(len(price)):
+        lvr[k] = -(10000 - fee) / 10000 * (base_in[k] * price[k] + quote_in[k]) + (
+            base_out[k] * price[k] + quote_out[k]
+        )
+        fee_income[k] = fee / 10000 * (base_in[k] * price[k] + quote_in[k])
+        gas_cost = (base_fee[k] * gas + l1_fee[k]) / 10**18
+        if is_eth_base:
+            gas_cost *= price[k]
+        arb[k] = lvr[k] - fee_income[k] - gas_cost
+    return (lvr, fee_income, arb)
+
+
+def _v2_pnl_numpy(
+    base_in,
+    quote_in,
+    base_out,
+    quote_out,
+    price,
+    base_fee,
+    l1_fee,
+    fee,
+    gas,
+    is_eth_base,
+):
+    lvr = -(10000 - fee) / 10000 * (base_in * price + quote_in) + (
+        base_out * price + quote_out
+    )
+    fee_income = fee / 10000 * (base_in * price + quote_in)
+    gas_cost = (base_fee * gas + l1_fee) / 10**18
+    if is_eth_base:
+        gas_cost = gas_cost * price
+    return (lvr, fee_income, lvr - fee_income - gas_cost)
+
+
+def v2_pnl(
+    base_in,
+    quote_in,
+    base_out,
+    quote_out,
+    price,
+    base_fee,
+    l1_fee,
+    fee,
+    gas,
+    is_eth_base,
+):
+    """
+    LVR (trader's PnL without swap fee and gas cost), fee income, and
+    arbitrage profit after swap fee and gas cost, of V2 swaps.
+    The gas cost is (gas) units at the base fee plus the L1 data fee of an L2
+    (see gas_costs.py), both in wei. It is paid in ETH, so it is converted
+    with the price when ETH is the base token.
+    """
+    arrays = _float_arrays(
+        base_in, quote_in, base_out, quote_out, price, base_fee, l1_fee
+    )
+    if NUMBA_AVAILABLE:
+        return _v2_pnl_numba(*arrays, fee, gas, is_eth_base)
+    return _v2_pnl_numpy(*arrays, fee, gas, is_eth_base)
+
+
+@jit
+def _v3_pnl_numba(
+    base_amount, quote_amount, price, base_fee, l1_fee, fee, gas, is_eth_base
+):
+    lvr = np.empty(len(price))
+    fee_income = np.empty(len(price))
+    arb = np.empty(len(price))
+    for k in range(len(price)):
+        # clip(lower=0.0) and clip(upper=0.0), which keep NaN
+        base_in = 0.0 if base_amount[k] < 0.0 else base_amount[k]
+        quote_in = 0.0 if quote_amount[k] < 0.0 else quote_amount[k]
+        base_out = 0.0 if base_amount[k] > 0.0 else base_amount[k]
+        quote_out = 0.0 if quote_amount[k] > 0.0 else quote_amount[k]
+        lvr[k] = -(10000 - fee) / 10000 * (base_in * price[k] + quote_in) - (
+            base_out * price[k] + quote_out
+        )
+        fee_income[k] = fee / 10000 * (base_in * price[k] + quote_in)
+        gas_cost = (base_fee[k] * gas + l1_fee[k]) / 10**18
+        if is_eth_base:
+            gas_cost *= price[k]
+        arb[k] = lvr[k] - fee_income[k] - gas_cost
+    return (lvr, fee_income, arb)
+
+
+def _v3_pnl_numpy(
+    base_amount, quote_amount, price, base_fee, l1_fee, fee, gas, is_eth_base
+):
+    (base_in, quote_in) = (base_amount.clip(min=0.0), quote_amount.clip(min=0.0))
+    (base_out, quote_out) = (base_amount.clip(max=0.0), quote_amount.clip(max=0.0))
+    lvr = -(10000 - fee) / 10000 * (base_in * price + quote_in) - (
+        base_out * price + quote_out
+    )
+    fee_income = fee / 10000 * (base_in * price + quote_in)
+    gas_cost = (base_fee * gas + l1_fee) / 10**18
+    if is_eth_base:
+        gas_cost = gas_cost * price
+    return (lvr, fee_income, lvr - fee_income - gas_cost)
+
+
+def v3_pnl(base_amount, quote_amount, price, base_fee, l1_fee, fee, gas, is_eth_base):
+    """
+    v2_pnl for V3 swaps, whose signed amounts are positive into the pool.
+    """
+    arrays = _float_arrays(base_amount, quote_amount, price, base_fee, l1_fee)
+    if NUMBA_AVAILABLE:
+        return _v3_pnl_numba(*arrays, fee, gas, is_eth_base)
+    return _v3_pnl_numpy(*arrays, fee, gas, is_eth_base)
+
+
+def _float_arrays(*columns):
+    return tuple(np.asarray(column, dtype=np.float64) for column in columns)
+
+
+############################################################
+#                  block classification                    #
+############################################################
+
+
+@jit
+def _classify_blocks_numba(block_number, arb, direction):
+    n = len(block_number)
+    block_arb = np.empty(n)
+    swap_count = np.empty(n, dtype=np.int64)
+    sandwich_like = np.empty(n, dtype=np.bool_)
+    start = 0
+    while start < n:
+        end = start + 1
+        while end < n and block_number[end] == block_number[start]:
+            end += 1
+        total = 0.0
+        count = 0
+        first = 0.0
+        last = 0.0
+        same_as_first = 0
+        for k in range(start, end):
+            if not np.isnan(arb[k]):
+                total += arb[k]
+            if direction[k] != 0.0:
+                if count == 0:
+                    first = direction[k]
+                count += 1
+                last = direction[k]
+                if direction[k] == first:
+                    same_as_first += 1
+        sandwich = count >= 3 and last == -first and same_as_first >= 2
+        for k in range(start, end):
+            block_arb[k] = total
+            swap_count[k] = count
+            sandwich_like[k] = sandwich
+        start = end
+    return (block_arb, swap_count, sandwich_like)
+
+
+def _classify_blocks_numpy(block_number, arb, direction):
+    n = len(block_number)
+    starts = np.flatnonzero(np.r_[True, block_number[1:] != block_number[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    block_arb = np.add.reduceat(np.where(np.isnan(arb), 0.0, arb), starts)
+
+    is_swap = direction != 0.0
+    swap_count = np.add.reduceat(is_swap.astype(np.int64), starts)
+    # direction of the first and the last swap of every block
+    blocks = np.repeat(np.arange(len(starts)), counts)
+    (first, last) = (np.zeros(len(starts)), np.zeros(len(starts)))
+    last[blocks[is_swap]] = direction[is_swap]
+    first[blocks[is_swap][::-1]] = direction[is_swap][::-1]
+    same_as_first = np.add.reduceat(
+        (is_swap & (direction == np.repeat(first, counts))).astype(np.int64), starts
+    )
+    sandwich_like = (swap_count >= 3) & (last == -first) & (same_as_first >= 2)
+    return (
+        np.repeat(block_arb, counts),
+        np.repeat(swap_count, counts),
+        np.repeat(sandwich_like, counts),
+    )
+
+
+def classify_blocks(block_number, arb, direction):
+    """
+    For every row, in one pass over the blocks (the rows are sorted by block):
+    the total ARB of its block, the number of swaps in the block, and whether
+    the block is sandwich-like, i.e. it has 3 swaps or more, the last swap is
+    opposite to the first one, and another swap goes the same way as the first.
+    (direction) is +1 or -1 for a swap depending on its side, and 0 otherwise.
+    """
+    block_number = np.asarray(block_number)
+    (arb, direction) = _float_arrays(arb, direction)
+    if NUMBA_AVAILABLE:
+        return _classify_blocks_numba(block_number, arb, direction)
+    return _classify_blocks_numpy(block_number, arb, direction)
+
+
+############################################################
+#                      parity check                        #
+############################################################
+
+
+PARITY_TOLERANCE = 1e-9  # of the largest value, for the reordered float sums
+
+
+def check_parity(n=1_000_000, seed=0):
+    """
+    Run the numba and NumPy version of every kernel on random data, print
+    their largest difference and their run times, and return the names of
+    the kernels whose versions differ by more than PARITY_TOLERANCE or
+    have NaN in different rows.
+    """
+    rng = np.random.default_rng(seed)
+    price = 2000 * np.exp(np.cumsum(rng.normal(0, 2e-4, n)))
+    (returns, log_returns) = _lagged_returns_numpy(price, 60)
+    modulus = np.arange(n) % 60
+    vol_squared = rng.uniform(0, 1e-3, n)
+    lam = np.full(n, 7200.0)
+    gamma = np.log(1 + 30 / 10000)
+    probability = rng.uniform(0, 1, n)
+    amounts = [rng.exponential(1, n) * (rng.uniform(0, 1, n) < 0.3) for _ in range(4)]
+    signed_amounts = [rng.normal(0, 1, n) for _ in range(2)]
+    base_fee = rng.uniform(1e9, 1e11, n)
+    l1_fee = rng.uniform(1e12, 1e14, n)
+    block_number = np.cumsum(rng.uniform(0, 1, n) < 0.3)
+    direction = rng.choice([-1.0, 0.0, 1.0], n)
+
+    cases = {
+        "lagged_returns": (_lagged_returns_numba, _lagged_returns_numpy, (price, 60)),
+        "rolling_vol_squared": (
+            rolling_vol_squared,
+            _rolling_vol_squared_numpy,
+            (modulus, returns, log_returns, 30),
+        ),
+        "trade_probability": (
+            _trade_probability_numba,
+            _trade_probability_numpy,
+            (vol_squared, lam, gamma),
+        ),
+        "prediction_rates": (
+            _prediction_rates_numba,
+            _prediction_rates_numpy,
+            (vol_squared, lam, probability, gamma),
+        ),
+        "v2_pnl": (
+            _v2_pnl_numba,
+            _v2_pnl_numpy,
+            (*amounts, price, base_fee, l1_fee, 30, 140000, True),
+        ),
+        "v3_pnl": (
+            _v3_pnl_numba,
+            _v3_pnl_numpy,
+            (*signed_amounts, price, base_fee, l1_fee, 30, 120000, True),
+        ),
+        "classify_blocks": (
+            _classify_blocks_numba,
+            _classify_blocks_numpy,
+            (block_number, signed_amounts[0], direction),
+        ),
+    }
+    failures = []
+    for name, (numba_kernel, numpy_kernel, args) in cases.items():
+        numba_kernel(*args)  # compile
+        start_time = time.perf_counter()
+        numba_result = numba_kernel(*args)
+        numba_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        numpy_result = numpy_kernel(*args)
+        numpy_time = time.perf_counter() - start_time
+
+        if isinstance(numpy_result, np.ndarray):
+            (numba_result, numpy_result) = ((numba_result,), (numpy_result,))
+        pairs = list(zip(_float_arrays(*numba_result), _float_arrays(*numpy_result)))
+        difference = max(
+            np.nanmax(np.abs(a - b)) / np.nanmax(np.abs(b)) for a, b in pairs
+        )
+        same_nan = all(np.array_equal(np.isnan(a), np.isnan(b)) for a, b in pairs)
+        passed = same_nan and len(numba_result) == len(numpy_result)
+        passed = passed and difference <= PARITY_TOLERANCE
+        if not passed:
+            failures.append(name)
+        print(
+            f"{name:<20} max difference {difference:.1e} (of the largest value), "
+            f"numba {numba_time * 1000:.1f} ms, numpy {numpy_time * 1000:.1f} ms"
+            + ("" if passed else ", MISMATCH")
+        )
+    return failures
+
+
+if __name__ == "__main__":
+    if not NUMBA_AVAILABLE:
+        print("numba is not installed; only the NumPy kernels are available.")
+    else:
+        # the parity itself is asserted by tests/test_kernels.py
+        check_parity()
@@ -0,0 +1,181 @@
+"""
+decode the raw logs of a whole chunk at once into limb columns (see fixed_point.py).
+
+The data of events with only static types is a sequence of 32 byte ABI words,
+so the data of n logs is read as an (n, words, 32) byte array, and each
+integer is sliced out of its word as big-endian 64 bit limbs.
+"""
+import numpy as np
+import web3
+from fixed_point import integer_layout, negate_limbs, columns_from_limbs
+
+V2_SWAP_TOPIC = web3.Web3.keccak(
+    text="Swap(address,uint256,uint256,uint256,uint256,address)"
+)
+TRANSFER_TOPIC = web3.Web3.keccak(text="Transfer(address,address,uint256)")
+SYNC_TOPIC = web3.Web3.keccak(text="Sync(uint112,uint112)")
+V3_SWAP_TOPIC = web3.Web3.keccak(
+    text="Swap(address,address,int256,int256,uint160,uint128,int24)"
+)
+ZERO_TOPIC = bytes(32)
+
+"""
+integer type (see fixed_point.py) of the integer columns of every decoded table.
+The balances of a V2 pair are uint112, which bounds its amounts and reserves,
+and its totalSupply (about the geometric mean of the reserves) likewise.
+"""
+V2_PAIR_TABLES = {
+    "swaps": {
+        "amount0In": "uint128",
+        "amount1In": "uint128",
+        "amount0Out": "uint128",
+        "amount1Out": "uint128",
+    },
+    "mints_and_burns": {"amount": "int192"},
+    "syncs": {"reserve0": "uint128", "reserve1": "uint128"},
+}
+V3_POOL_TABLES = {
+    "swaps": {
+        "amount0": "int128",
+        "amount1": "int128",
+        "sqrtPriceX96": "uint192",
+        "liquidity": "uint128",
+        "tick": "int64",
+    },
+}
+
+
+def _to_bytes(value):
+    # HexBytes from web3, or the hex string of a raw JSON-RPC response
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:])
+    return bytes(value)
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def _words(logs, n_words):
+    data = b"".join(_to_bytes(log["data"]) for log in logs)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(logs), n_words, 32)
+
+
+def _topics(logs, position):
+    data = b"".join(_to_bytes(log["topics"][position]) for log in logs)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(logs), 32)
+
+
+def _matches(topics, topic):
+    return (topics == np.frombuffer(bytes(topic), dtype=np.uint8)).all(axis=1)
+
+
+def _keys(logs):
+    return {
+        "blockNumber": np.array(
+            [_to_int(log["blockNumber"]) for log in logs], dtype=np.int64
+        ),
+        "logIndex": np.array(
+            [_to_int(log["logIndex"]) for log in logs], dtype=np.int64
+        ),
+    }
+
+
+def _word_limbs(words, i, name, integer_type):
+    """
+    uint64 limbs (least significant first) of the i-th word of every log,
+    an integer of the same signedness as (integer_type).
+    Raise OverflowError if a value does not fit in (integer_type).
+    """
+    (n_limbs, unsigned) = integer_layout(integer_type)
+    word = words[:, i, :]
+    limbs = [
+        word[:, 32 - 8 * (j + 1) : 32 - 8 * j]
+        .copy()
+        .view(">u8")
+        .ravel()
+        .astype(np.uint64)
+        for j in range(n_limbs)
+    ]
+
+    # the bytes above the limbs must be zero, or the sign extension of the top limb
+    upper = word[:, : 32 - 8 * n_limbs]
+    if unsigned:
+        fits = (upper == 0).all(axis=1)
+    else:
+        negative = (limbs[-1] >> np.uint64(63)).astype(bool)
+        fits = np.where(negative, (upper == 0xFF).all(axis=1), (upper == 0).all(axis=1))
+    if not fits.all():
+        raise OverflowError(f"{name} does not fit in {integer_type}")
+    return limbs
+
+
+def _word_columns(words, i, name, integer_type):
+    return columns_from_limbs(
+        name,
+        _word_limbs(words, i, name, integer_type),
+        unsigned=integer_layout(integer_type)[1],
+    )
+
+
+def decode_v2_pair_logs(logs):
+    """
+    Split the Swap, Transfer and Sync logs of a V2 pair and decode them into
+    (swaps, mints_and_burns, syncs) columns. Mints are Transfers from the zero
+    address, burns are Transfers to the zero address with negated amounts.
+    The MINIMUM_LIQUIDITY of the first mint goes from the zero address to the
+    zero address and stays in the totalSupply, so it is a mint.
+    """
+    topic0 = _topics(logs, 0)
+    swap_logs = [logs[i] for i in np.flatnonzero(_matches(topic0, V2_SWAP_TOPIC))]
+    sync_logs = [logs[i] for i in np.flatnonzero(_matches(topic0, SYNC_TOPIC))]
+    transfer_logs = [logs[i] for i in np.flatnonzero(_matches(topic0, TRANSFER_TOPIC))]
+
+    is_mint = _matches(_topics(transfer_logs, 1), ZERO_TOPIC)
+    is_burn = _matches(_topics(transfer_logs, 2), ZERO_TOPIC) & ~is_mint
+    mint_and_burn_logs = [transfer_logs[i] for i in np.flatnonzero(is_mint | is_burn)]
+    is_burn = is_burn[is_mint | is_burn]
+
+    swap_words = _words(swap_logs, 4)
+    swaps = {
+        **_keys(swap_logs),
+        **_word_columns(swap_words, 0, "amount0In", "uint128"),
+        **_word_columns(swap_words, 1, "amount1In", "uint128"),
+        **_word_columns(swap_words, 2, "amount0Out", "uint128"),
+        **_word_columns(swap_words, 3, "amount1Out", "uint128"),
+    }
+
+    # the uint256 value, below 2**191 so that its negation fits in int192
+    amounts = _word_limbs(_words(mint_and_burn_logs, 1), 0, "amount", "uint192")
+    if (amounts[-1] >> np.uint64(63)).any():
+        raise OverflowError("amount does not fit in int192")
+    mints_and_burns = {
+        **_keys(mint_and_burn_logs),
+        **columns_from_limbs("amount", negate_limbs(amounts, is_burn)),
+    }
+
+    sync_words = _words(sync_logs, 2)
+    syncs = {
+        **_keys(sync_logs),
+        **_word_columns(sync_words, 0, "reserve0", "uint128"),
+        **_word_columns(sync_words, 1, "reserve1", "uint128"),
+    }
+    return (swaps, mints_and_burns, syncs)
+
+
+def decode_v3_swap_logs(logs):
+    """
+    decode the Swap logs of a V3 pool into columns.
+    The int24 tick fits in one limb, which is kept as a plain int64 column.
+    """
+    words = _words(logs, 5)
+    return {
+        **_keys(logs),
+        **_word_columns(words, 0, "amount0", "int128"),
+        **_word_columns(words, 1, "amount1", "int128"),
+        **_word_columns(words, 2, "sqrtPriceX96", "uint192"),
+        **_word_columns(words, 3, "liquidity", "uint128"),
+        "tick": _word_limbs(words, 4, "tick", "int64")[0].view(np.int64),
+    }
@@ -0,0 +1,264 @@
+"""
+fetch event logs over many block chunks concurrently with asyncio.
+"""
+import os
+import json
+import fcntl
+import asyncio
+import time
+import multiprocessing
+
+"""
+last good window (in blocks) of each pool, so the next run starts from
+a window that fits the event density of the pool.
+"""
+WINDOW_SIZES_PATH = "data/onchain_events/window_sizes.json"
+
+"""
+error messages of providers when the requested block range or response is too large.
+(alchemy, infura, quicknode, llamarpc/ankr, geth/erigon)
+"""
+RANGE_TOO_LARGE_MESSAGES = [
+    "log response size exceeded",
+    "query returned more than",
+    "blocks range",
+    "block range",
+    "range is too large",
+    "response size",
+    "query timeout exceeded",
+]
+
+"""
+error messages of providers when the request rate or compute budget is exceeded,
+checked before RANGE_TOO_LARGE_MESSAGES: these are retried with backoff as they are.
+"""
+RATE_LIMITED_MESSAGES = [
+    "too many requests",
+    "rate limit",
+    "request rate exceeded",
+    "compute units",
+    "capacity",
+    "throughput",
+]
+
+
+class RangeTooLarge(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Hand out request slots spaced 1 / requests_per_second apart,
+    so the whole fetch stays within the budget of the RPC provider.
+
+    Pass a multiprocessing.Value("d") as next_slot to share one budget
+    between the worker processes which query the same endpoint.
+    """
+
+    def __init__(self, requests_per_second, next_slot=None):
+        self.interval = 1 / requests_per_second
+        if next_slot is None:
+            next_slot = multiprocessing.Value("d", 0.0)
+        self.next_slot = next_slot
+
+    async def wait(self):
+        await asyncio.sleep(self._reserve())
+
+    def wait_blocking(self):
+        time.sleep(self._reserve())
+
+    def _reserve(self):
+        """
+        take the next slot and return the seconds until it.
+        """
+        now = time.time()
+        with self.next_slot.get_lock():
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        return slot - now
+
+
+def construct_rate_limit_middleware(rate_limiter):
+    """
+    web3 middleware which takes a slot of (rate_limiter) before every request,
+    so the sync calls of a getter share the budget of its eth_getLogs.
+    """
+
+    def rate_limit_middleware(make_request, w3):
+        def middleware(method, params):
+            rate_limiter.wait_blocking()
+            return make_request(method, params)
+
+        return middleware
+
+    return rate_limit_middleware
+
+
+class LogFetcher:
+    """
+    Keep at most (max_in_flight) chunks in flight and at most
+    (requests_per_second) requests per second against the provider.
+
+    The chunk (window) size adapts to the event density of the pool:
+    it doubles while responses hold less than a quarter of (target_logs),
+    halves when they hold more than (target_logs), and a chunk is bisected
+    when the provider rejects it as too large or times out.
+    """
+
+    def __init__(
+        self,
+        max_in_flight=8,
+        requests_per_second=10,
+        max_retries=5,
+        initial_window=1800,
+        max_window=500_000,
+        target_logs=5000,
+        rate_limiter=None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.initial_window = initial_window
+        self.max_window = max_window
+        self.target_logs = target_logs
+
+    async def get_raw_logs(self, async_w3, filter_params):
+        """
+        rate-limited eth_getLogs with exponential backoff.
+        filter_params may carry a list of topics in any position (OR filter),
+        so several events of one contract come back in a single round trip.
+        """
+        for attempt in range(self.max_retries):
+            await self.rate_limiter.wait()
+            try:
+                return await async_w3.eth.get_logs(filter_params)
+            except Exception as e:
+                # a rate limit is retried like any other failure, with the same range
+                if not is_rate_limited(e) and is_range_too_large(e):
+                    raise RangeTooLarge(e)
+                if attempt == self.max_retries - 1:
+                    raise
+                print(f"Request failed ({e}), retrying..")
+                await asyncio.sleep(2**attempt)
+
+    async def _fetch_all(
+        self, async_w3, filter_params, on_chunk, from_block, to_block, key
+    ):
+        window = load_window_size(key, self.initial_window)
+        cursor = from_block
+        bisected = []  # ranges to retry after a bisection
+        in_flight = 0
+        fetched_blocks = 0
+        total_blocks = to_block - from_block
+
+        async def worker():
+            nonlocal window, cursor, in_flight, fetched_blocks
+            while True:
+                if bisected:
+                    (chunk_start, chunk_end) = bisected.pop()
+                elif cursor < to_block:
+                    chunk_start = cursor
+                    chunk_end = min(cursor + window, to_block) - 1
+                    cursor = chunk_end + 1
+                elif in_flight > 0:
+                    # other workers may still bisect their chunks
+                    await asyncio.sleep(0.05)
+                    continue
+                else:
+                    return
+
+                in_flight += 1
+                try:
+                    logs = await self.get_raw_logs(
+                        async_w3,
+                        {
+                            **filter_params,
+                            "fromBlock": chunk_start,
+                            "toBlock": chunk_end,
+                        },
+                    )
+                except RangeTooLarge:
+                    if chunk_start == chunk_end:
+                        raise
+                    mid = (chunk_start + chunk_end) // 2
+                    bisected.extend([(mid + 1, chunk_end), (chunk_start, mid)])
+                    window = max(min(window, chunk_end - chunk_start + 1) // 2, 1)
+                    continue
+                finally:
+                    in_flight -= 1
+
+                if len(logs) > self.target_logs:
+                    window = max(window // 2, 1)
+                elif len(logs) < self.target_logs // 4:
+                    window = min(window * 2, self.max_window)
+                on_chunk(chunk_start, chunk_end, logs)
+
+                # report progress every 10%
+                chunk_blocks = chunk_end - chunk_start + 1
+                if (fetched_blocks + chunk_blocks) * 10 // total_blocks > (
+                    fetched_blocks * 10 // total_blocks
+                ):
+                    print(
+                        f"{key}: {(fetched_blocks + chunk_blocks) * 100 // total_blocks}% "
+                        f"({fetched_blocks + chunk_blocks}/{total_blocks} blocks)"
+                    )
+                fetched_blocks += chunk_blocks
+
+        await asyncio.gather(*[worker() for _ in range(self.max_in_flight)])
+        save_window_size(key, window)
+
+    def run(self, async_w3, filter_params, on_chunk, from_block, to_block, key):
+        """
+        Fetch the logs matching filter_params in [from_block, to_block) and
+        hand every completed chunk to on_chunk(chunk_start, chunk_end, logs).
+        Chunks complete out of order. key identifies the pool in the progress
+        report and for the remembered window size.
+        """
+        asyncio.run(
+            self._fetch_all(
+                async_w3, filter_params, on_chunk, from_block, to_block, key
+            )
+        )
+
+
+def is_rate_limited(e):
+    status = getattr(e, "status", None) or getattr(
+        getattr(e, "response", None), "status_code", None
+    )
+    if status == 429:
+        return True
+    message = str(e).lower()
+    return any(m in message for m in RATE_LIMITED_MESSAGES)
+
+
+def is_range_too_large(e):
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    message = str(e).lower()
+    return any(m in message for m in RANGE_TOO_LARGE_MESSAGES)
+
+
+def load_window_size(key, default):
+    if not os.path.exists(WINDOW_SIZES_PATH):
+        return default
+    with open(WINDOW_SIZES_PATH) as f:
+        return json.load(f).get(key, default)
+
+
+def save_window_size(key, window):
+    """
+    update the window of (key), holding a lock on the file against the
+    other worker processes of batch_events_getter.py.
+    """
+    os.makedirs(os.path.dirname(WINDOW_SIZES_PATH), exist_ok=True)
+    with open(f"{WINDOW_SIZES_PATH}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        window_sizes = {}
+        if os.path.exists(WINDOW_SIZES_PATH):
+            with open(WINDOW_SIZES_PATH) as f:
+                window_sizes = json.load(f)
+        window_sizes[key] = window
+        tmp_path = f"{WINDOW_SIZES_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(window_sizes, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, WINDOW_SIZES_PATH)
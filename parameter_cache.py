@@ -0,0 +1,71 @@
+"""
+memoization of the DataFrames computed from the input files, shared by all pools.
+
+A frame is keyed by the sha256 of the contents of its input files and by its
+parameters. The last MEMORY_SIZE frames are kept in memory, and every frame is
+kept on disk as an Arrow IPC (feather) file.
+Remove data/parameter_cache/ to free the disk space.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+CACHE_PATH = "data/parameter_cache"
+MEMORY_SIZE = 8
+
+_frames = OrderedDict()  # in-memory LRU, most recently used last
+_file_hashes = {}
+_lock = threading.Lock()  # for the frames shared by the threads of parameter_sweep
+
+
+def file_hash(path):
+    """
+    sha256 of the contents of the file, computed once per version of the file.
+    """
+    stat = os.stat(path)
+    version = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if version not in _file_hashes:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+        _file_hashes[version] = sha256.hexdigest()
+    return _file_hashes[version]
+
+
+def cache_key(name, paths, params):
+    return hashlib.sha256(
+        json.dumps([name, [file_hash(path) for path in paths], list(params)]).encode()
+    ).hexdigest()
+
+
+def cached_frame(name, paths, params, compute):
+    """
+    Return compute(), memoized by the contents of the files (paths) and (params).
+    The caller gets a copy, which it is free to modify.
+    """
+    key = cache_key(name, paths, params)
+
+    with _lock:
+        if key in _frames:
+            _frames.move_to_end(key)
+            return _frames[key].copy()
+
+    cache_path = f"{CACHE_PATH}/{name}_{key[:16]}.arrow"
+    if os.path.exists(cache_path):
+        df = pd.read_feather(cache_path)
+    else:
+        df = compute().reset_index(drop=True)
+        os.makedirs(CACHE_PATH, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    with _lock:
+        _frames[key] = df
+        if len(_frames) > MEMORY_SIZE:
+            _frames.popitem(last=False)
+    return df.copy()
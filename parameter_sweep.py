@@ -0,0 +1,128 @@
+"""
+parameter sweep of data_processor over grids of
+(interval, window, use_instant_volatility, latency, gas) for the pools of a ticker pair.
+
+The events of every pool are read once, the parameters are computed once per
+(use_instant_volatility, interval, window, latency) and the predictions once per fee,
+and every merged pool frame is reused for all the gas units.
+The parameter combinations are evaluated by a pool of threads, which share the
+loaded data; the heavy kernels release the GIL (see kernels.py).
+"""
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from utils import cex_latency, read_blocks
+from data_processor import (
+    cex_parameters,
+    compute_predictions,
+    read_pool_events,
+    add_historical_data,
+    add_pnl,
+    process_data,
+)
+
+# identifying columns of the sweep result, followed by timestamp, metric and value
+SWEEP_COLUMNS = [
+    "dex",
+    "pool",
+    "fee",
+    "useInstantVolatility",
+    "interval",
+    "window",
+    "latency",
+    "gas",
+]
+
+
+def sweep(
+    network,
+    base_token,
+    quote_token,
+    pools,
+    intervals,
+    windows,
+    use_instant_volatilities=(False,),
+    latencies=(None,),
+    gas_units=(None,),
+    max_workers=None,
+):
+    """
+    Run the pools, a list of (pool_model, dex, fee) as in
+    data_processor.pools_swaps_and_arbitrages, for every combination of the grids.
+    latency None is the default latency of the network, and gas None is
+    the gas units of the pool model.
+
+    Returns a long table with one row per combination, pool, interval and metric
+    (the columns of data_processor.INTERVAL_COLUMNS), e.g. for boxplots
+        df[df["metric"] == "realizedLVRperPoolValue"].groupby(["interval", "window"])
+    The window of the instantaneous volatility rows is NaN, since it is not used.
+    """
+    blocks_df = read_blocks(network, ["blockNumber"])
+    events = [
+        read_pool_events(
+            pool_model, network, dex, base_token, quote_token, fee, blocks_df
+        )
+        for pool_model, dex, fee in pools
+    ]
+
+    combinations = []
+    for use_instant_volatility, interval, window, latency in itertools.product(
+        use_instant_volatilities, intervals, windows, latencies
+    ):
+        combination = (
+            use_instant_volatility,
+            interval,
+            None if use_instant_volatility else window,
+            cex_latency(network, latency),
+        )
+        if combination not in combinations:
+            combinations.append(combination)
+
+    def evaluate(combination):
+        (use_instant_volatility, interval, window, latency) = combination
+        blocks_price = cex_parameters(
+            network,
+            base_token,
+            quote_token,
+            use_instant_volatility,
+            interval,
+            window,
+            latency,
+        )
+        predictions = {}
+        results = []
+        for (pool_model, dex, fee), events_df in zip(pools, events):
+            if fee not in predictions:
+                predictions[fee] = compute_predictions(blocks_price, fee)
+            merged = add_historical_data(pool_model, predictions[fee], events_df)
+            for gas in gas_units:
+                blocks_price_events = merged.copy() if len(gas_units) > 1 else merged
+                add_pnl(pool_model, blocks_price_events, base_token, fee, gas)
+                (_, df) = process_data(pool_model, blocks_price_events, interval)
+                results.append(
+                    df.melt(id_vars="timestamp", var_name="metric").assign(
+                        dex=dex,
+                        pool=pool_model.name,
+                        fee=fee,
+                        useInstantVolatility=use_instant_volatility,
+                        interval=interval,
+                        window=np.nan if window is None else window,
+                        latency=latency,
+                        gas=pool_model.gas if gas is None else gas,
+                    )
+                )
+        print(
+            f"interval {interval}, window {window}, "
+            f"instant volatility {use_instant_volatility}, latency {latency} done."
+        )
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = [
+            df for results in executor.map(evaluate, combinations) for df in results
+        ]
+
+    return pd.concat(frames, ignore_index=True)[
+        SWEEP_COLUMNS + ["timestamp", "metric", "value"]
+    ]
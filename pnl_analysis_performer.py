@@ -2,6 +2,8 @@
 perform the analysis related to pnl.
 """
 import data_processor
+import pool_executor
+from pool_models import CONSTANT_PRODUCT, CONCENTRATED_LIQUIDITY
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
@@ -36,35 +38,25 @@ def v2_and_v3_pnl(
     else:
         quote_tokens = ["USDC", "USDCe", "USDT", "DAI", "WBTC"]
 
-    v2_swaps_list = []
-    v3_swaps_list = []
-    v2_arbs_list = []
-    v3_arbs_list = []
-    for quote_token in quote_tokens:
-        (v2_swaps, v2_arbs) = data_processor.v2_swaps_and_arbitrages(
-            network,
-            v2_dex,
-            base_token,
-            quote_token,
-            fee,
-            use_instant_volatility,
-            interval,
-            window,
-        )
-        (v3_swaps, v3_arbs) = data_processor.v3_swaps_and_arbitrages(
-            network,
-            "UNI_V3",
-            base_token,
-            quote_token,
-            fee,
-            use_instant_volatility,
-            interval,
-            window,
-        )
-        v2_swaps_list.append(v2_swaps)
-        v3_swaps_list.append(v3_swaps)
-        v2_arbs_list.append(v2_arbs)
-        v3_arbs_list.append(v3_arbs)
+    # V2 and V3 pools on the same price and volatility, evaluated in parallel
+    results = pool_executor.evaluate_pools(
+        network,
+        [
+            (pool_model, dex, base_token, quote_token, fee)
+            for quote_token in quote_tokens
+            for pool_model, dex in [
+                (CONSTANT_PRODUCT, v2_dex),
+                (CONCENTRATED_LIQUIDITY, "UNI_V3"),
+            ]
+        ],
+        use_instant_volatility,
+        interval,
+        window,
+    )
+    v2_swaps_list = [swaps for swaps, _ in results[0::2]]
+    v2_arbs_list = [arbs for _, arbs in results[0::2]]
+    v3_swaps_list = [swaps for swaps, _ in results[1::2]]
+    v3_arbs_list = [arbs for _, arbs in results[1::2]]
 
     ############################################################
     #           plot the cumulative fee - lvr graph            #
@@ -183,22 +175,19 @@ def v3_fee_and_pnl(
 
     fees = [5, 30, 100]
 
-    v3_swaps_list = []
-    v3_arbs_list = []
-    for quote_token in quote_tokens:
-        for fee in fees:
-            (v3_swaps, v3_arbs) = data_processor.v3_swaps_and_arbitrages(
-                network,
-                "UNI_V3",
-                "WETH",
-                quote_token,
-                fee,
-                use_instant_volatility,
-                interval,
-                window,
-            )
-            v3_swaps_list.append(v3_swaps)
-            v3_arbs_list.append(v3_arbs)
+    results = pool_executor.evaluate_pools(
+        network,
+        [
+            (CONCENTRATED_LIQUIDITY, "UNI_V3", "WETH", quote_token, fee)
+            for quote_token in quote_tokens
+            for fee in fees
+        ],
+        use_instant_volatility,
+        interval,
+        window,
+    )
+    v3_swaps_list = [swaps for swaps, _ in results]
+    v3_arbs_list = [arbs for _, arbs in results]
 
     ############################################################
     #           plot the cumulative fee - lvr graph            #
@@ -259,22 +248,19 @@ def v3_pnl_and_vol(
 
     fees = [5, 30, 100]
 
-    v3_swaps_list = []
-    v3_arbs_list = []
-    for quote_token in quote_tokens:
-        for fee in fees:
-            (v3_swaps, v3_arbs) = data_processor.v3_swaps_and_arbitrages(
-                network,
-                "UNI_V3",
-                "WETH",
-                quote_token,
-                fee,
-                use_instant_volatility,
-                interval,
-                window,
-            )
-            v3_swaps_list.append(v3_swaps)
-            v3_arbs_list.append(v3_arbs)
+    results = pool_executor.evaluate_pools(
+        network,
+        [
+            (CONCENTRATED_LIQUIDITY, "UNI_V3", "WETH", quote_token, fee)
+            for quote_token in quote_tokens
+            for fee in fees
+        ],
+        use_instant_volatility,
+        interval,
+        window,
+    )
+    v3_swaps_list = [swaps for swaps, _ in results]
+    v3_arbs_list = [arbs for _, arbs in results]
 
     ############################################################
     #           plot the cumulative fee - lvr graph            #
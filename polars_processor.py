@@ -0,0 +1,443 @@
+"""
+polars backend of data_processor.v2_swaps_and_arbitrages and v3_swaps_and_arbitrages.
+
+The whole processing of a pool is one LazyFrame query
+    scan cex price -> returns and volatility -> join_asof onto the blocks
+    -> parameters and predictions -> join the events -> realized PnL
+    -> group_by_dynamic over the intervals
+which polars optimizes (projection pushdown, common subplans) and runs
+multi-threaded. Only the final (swaps, df) frames are converted into pandas.
+"""
+from datetime import datetime, timezone
+import numpy as np
+import polars as pl
+from utils import token_to_ticker, cex_latency, block_paths, read_blocks
+from price_store import scan_pair_prices
+from event_files import V2_EVENT_COLUMNS, V3_EVENT_COLUMNS, scan_events
+from gas_costs import L1_NETWORKS, l1_data_fee
+from pool_models import CONSTANT_PRODUCT, CONCENTRATED_LIQUIDITY
+
+
+def scan_blocks(network):
+    """
+    LazyFrame of utils.read_blocks, with the l1DataFee of gas_costs.py.
+    """
+    if network in L1_NETWORKS:
+        blocks = read_blocks(network)
+        blocks["l1DataFee"] = l1_data_fee(network, blocks["timestamp"])
+        return pl.from_pandas(blocks).lazy()
+    if block_paths(network)[0].endswith(".csv"):
+        blocks = pl.scan_csv(block_paths(network)[0])
+    else:
+        blocks = pl.from_pandas(read_blocks(network)).lazy()
+    return blocks.with_columns(pl.lit(0.0).alias("l1DataFee"))
+
+
+def scan_parameters(
+    network,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+):
+    """
+    LazyFrame of the blocks with the cex price, the volatility,
+    the parameters and the predictions (see data_processor.compute_cex_parameters
+    and data_processor.compute_predictions).
+    """
+    cex_price = scan_pair_prices(
+        token_to_ticker(base_token), token_to_ticker(quote_token)
+    )
+    lagged_price = pl.col("price").shift(interval).fill_null(pl.col("price").first())
+    cex_price = cex_price.with_columns(
+        ((pl.col("price") - lagged_price) / lagged_price).alias("return"),
+        (pl.col("price") / lagged_price).log().alias("logReturn"),
+    )
+
+    instant_vol_squared = 2 * (pl.col("return") - pl.col("logReturn"))
+    if use_instant_volatility:
+        vol_squared = instant_vol_squared
+    else:
+        # first sample of every phase: instantaneous volatility,
+        # then the variance of up to (window) logReturns of the phase.
+        cex_price = cex_price.with_columns(
+            ((pl.col("timestamp") - pl.col("timestamp").min()) % interval).alias(
+                "modulus"
+            )
+        )
+        vol_squared = (
+            pl.when(pl.col("timestamp") == pl.col("timestamp").min().over("modulus"))
+            .then(instant_vol_squared)
+            .otherwise(
+                pl.col("logReturn")
+                .rolling_var(window, min_periods=min(window, 2))
+                .over("modulus")
+            )
+        )
+    cex_price = (
+        cex_price.with_columns(
+            (vol_squared * (60 * 60 * 24 / interval)).alias("volSquared")
+        )  # convert into daily timeframe.
+        .with_columns(pl.col(pl.Float64).fill_null(0.0).fill_nan(0.0))
+        .set_sorted("timestamp")
+    )
+
+    # the latest cex price at or before (latency) seconds before every block,
+    # see data_processor.align_blocks
+    latency = cex_latency(network, latency)
+    blocks = (
+        scan_blocks(network)
+        .join(
+            cex_price.select(
+                pl.col("timestamp").first().alias("firstCexTimestamp"),
+                pl.count().alias("cexPriceCount"),
+            ),
+            how="cross",
+        )
+        .with_columns(
+            pl.max_horizontal(
+                pl.col("timestamp") - latency, pl.col("firstCexTimestamp")
+            )
+            .cast(pl.Float64)
+            .alias("cexTimestamp")
+        )
+        .set_sorted("cexTimestamp")
+    )
+    blocks_price = blocks.join_asof(
+        cex_price.rename({"timestamp": "cexTimestamp"})
+        .with_columns(pl.col("cexTimestamp").cast(pl.Float64))
+        .set_sorted("cexTimestamp"),
+        on="cexTimestamp",
+        strategy="backward",
+    ).drop("cexTimestamp", "firstCexTimestamp")
+
+    gamma = np.log(1 + fee / 10000)  # fee rate.
+    lam = pl.col("lambda")
+    vol = pl.col("volSquared")
+    return (
+        blocks_price.with_columns(
+            (60 * 60 * 24 * pl.count().cast(pl.Int64) / pl.col("cexPriceCount")).alias(
+                "lambda"
+            )
+        )
+        .drop("cexPriceCount")
+        .with_columns(
+            ((2 * lam).sqrt() * gamma / vol.sqrt()).alias("eta")
+        )  # composite parameter.
+        .with_columns((1 / (1 + pl.col("eta"))).alias("tradeProbability"))
+        .with_columns(
+            (vol / 8 / lam).alias("LVRperPoolValueRate"),
+            (
+                vol
+                / 8
+                * pl.col("tradeProbability")
+                * (
+                    (np.exp(gamma / 2) + np.exp(-gamma / 2))
+                    / (2 * (1 - vol / (8 * lam)))
+                )
+                / lam
+            ).alias("ARBperPoolValueRate"),
+        )  # from MMRZ22 and MMR23, multiplied by avg block time (= inverse of lambda)
+        .with_columns(
+            # NaN is skipped by the cumulative sums, as with pandas
+            pl.col("LVRperPoolValueRate")
+            .fill_nan(None)
+            .cum_sum()
+            .alias("expLVRperPoolValue"),
+            pl.col("ARBperPoolValueRate")
+            .fill_nan(None)
+            .cum_sum()
+            .alias("expARBperPoolValue"),
+        )
+    )
+
+
+def gas_cost(base_token, gas):
+    """
+    cost of (gas) units of gas and the L1 data fee, in quote token.
+    """
+    cost = (pl.col("baseFeePerGas") * gas + pl.col("l1DataFee")) / 10**18
+    if token_to_ticker(base_token) == "ETH":
+        cost = cost * pl.col("price")
+    return cost
+
+
+def interval_summary(blocks_price_events, arbitrages, interval):
+    """
+    LazyFrame counterpart of data_processor.interval_summary.
+    """
+    start_time = int(datetime(2023, 10, 1, tzinfo=timezone.utc).timestamp())
+    end_time = int(datetime(2023, 12, 1, tzinfo=timezone.utc).timestamp())
+    n_buckets = -(-(end_time - start_time) // interval)
+
+    def group_by_interval(lf, aggregations):
+        return (
+            lf.with_columns((pl.col("timestamp") - start_time).alias("offset"))
+            .filter((0 <= pl.col("offset")) & (pl.col("offset") < n_buckets * interval))
+            .set_sorted("offset")
+            .group_by_dynamic(
+                "offset", every=f"{interval}i", period=f"{interval}i", closed="left"
+            )
+            .agg(aggregations)
+        )
+
+    # NaN is skipped by the sums and means, as with pandas
+    blocks_in_interval = group_by_interval(
+        blocks_price_events,
+        [
+            pl.col("volSquared").fill_nan(None).mean().alias("meanVolSquared"),
+            pl.col("poolValue").fill_nan(None).mean().alias("meanPoolValue"),
+            pl.col("baseFeePerGas").fill_nan(None).mean().alias("meanBaseFeePerGas"),
+            pl.col("LVRperPoolValueRate")
+            .fill_nan(None)
+            .sum()
+            .alias("expectedLVRperPoolValue"),
+            pl.col("ARBperPoolValueRate")
+            .fill_nan(None)
+            .sum()
+            .alias("expectedARBperPoolValue"),
+        ],
+    )
+    arbitrages_in_interval = group_by_interval(
+        arbitrages,
+        [
+            (pl.col("LVR") / pl.col("poolValue"))
+            .fill_nan(None)
+            .sum()
+            .alias("realizedLVRperPoolValue"),
+            ((pl.col("LVR") - pl.col("FEE")) / pl.col("poolValue"))
+            .fill_nan(None)
+            .sum()
+            .alias("realizedARBperPoolValueWithoutGas"),
+            (pl.col("ARB") / pl.col("poolValue"))
+            .fill_nan(None)
+            .sum()
+            .alias("realizedARBperPoolValueWithGas"),
+        ],
+    )
+
+    # every interval, including the empty ones
+    sums = [
+        "expectedLVRperPoolValue",
+        "realizedLVRperPoolValue",
+        "expectedARBperPoolValue",
+        "realizedARBperPoolValueWithoutGas",
+        "realizedARBperPoolValueWithGas",
+    ]
+    return (
+        pl.LazyFrame(
+            {"offset": pl.int_range(0, n_buckets * interval, interval, eager=True)}
+        )
+        .join(blocks_in_interval, on="offset", how="left")
+        .join(arbitrages_in_interval, on="offset", how="left")
+        .with_columns(
+            (pl.col("offset") + start_time).alias("timestamp"),
+            pl.col(sums).fill_null(0.0),
+        )
+        .select(
+            "timestamp",
+            "meanVolSquared",
+            "meanPoolValue",
+            "meanBaseFeePerGas",
+            "expectedLVRperPoolValue",  # for error analysis
+            "realizedLVRperPoolValue",  # for error analysis
+            "expectedARBperPoolValue",  # for error analysis
+            "realizedARBperPoolValueWithoutGas",  # for error analysis
+            "realizedARBperPoolValueWithGas",  # for error analysis
+        )
+    )
+
+
+def classify_blocks(blocks_price_events, swap_direction):
+    """
+    LazyFrame counterpart of kernels.classify_blocks:
+    blockARB, swapsInBlock and sandwichLike of every row.
+    """
+    is_swap = pl.col("direction") != 0
+    return (
+        blocks_price_events.with_columns(swap_direction.alias("direction"))
+        .with_columns(
+            # NaN is skipped by the sum, as with pandas
+            pl.col("ARB").fill_nan(None).sum().over("blockNumber").alias("blockARB"),
+            is_swap.sum().over("blockNumber").cast(pl.Int64).alias("swapsInBlock"),
+            pl.col("direction")
+            .filter(is_swap)
+            .first()
+            .over("blockNumber")
+            .alias("firstDirection"),
+            pl.col("direction")
+            .filter(is_swap)
+            .last()
+            .over("blockNumber")
+            .alias("lastDirection"),
+        )
+        .with_columns(
+            (is_swap & (pl.col("direction") == pl.col("firstDirection")))
+            .sum()
+            .over("blockNumber")
+            .alias("sameAsFirst")
+        )
+        .with_columns(
+            (
+                (pl.col("swapsInBlock") >= 3)
+                & (pl.col("lastDirection") == -pl.col("firstDirection"))
+                & (pl.col("sameAsFirst") >= 2)
+            )
+            .fill_null(False)
+            .alias("sandwichLike")
+        )
+        .drop("direction", "firstDirection", "lastDirection", "sameAsFirst")
+    )
+
+
+def collect_swaps_and_arbitrages(
+    blocks_price_events, swap_size, swap_direction, interval
+):
+    """
+    Classify the blocks, split the swaps and the arbitrages, aggregate the
+    intervals, then run both queries at once and return them as pandas DataFrames.
+    """
+    blocks_price_events = classify_blocks(blocks_price_events, swap_direction)
+    swaps = blocks_price_events.filter(pl.col("FEE") > 0).with_columns(
+        swap_size.alias("swapSize")
+    )  # entire swap record, including retail orderflow.
+    arbitrages = blocks_price_events.filter(
+        pl.col("blockARB") > 0.0
+    )  # blocks with positive total arbitrage profit.
+    (swaps, df) = pl.collect_all(
+        [swaps, interval_summary(blocks_price_events, arbitrages, interval)]
+    )
+    return (swaps.to_pandas(), df.to_pandas())
+
+
+def v2_swaps_and_arbitrages(
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+    gas=None,
+):
+    blocks_price = scan_parameters(
+        network,
+        base_token,
+        quote_token,
+        fee,
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+    )
+    events = scan_events(
+        network, dex, base_token, quote_token, columns=V2_EVENT_COLUMNS
+    )
+
+    # fill the values of blocks without swaps, empty swap values are filled with 0
+    blocks_price_events = (
+        blocks_price.join(events, on="blockNumber", how="left")
+        .with_columns(
+            pl.col(["totalSupply", "baseReserve", "quoteReserve"])
+            .forward_fill()
+            .backward_fill()
+        )
+        .with_columns(pl.col(pl.Float64).fill_null(0.0).fill_nan(0.0))
+    )
+
+    value_in = pl.col("baseIn") * pl.col("price") + pl.col("quoteIn")
+    value_out = pl.col("baseOut") * pl.col("price") + pl.col("quoteOut")
+    blocks_price_events = (
+        blocks_price_events.with_columns(
+            (
+                2
+                * (
+                    pl.col("quoteReserve") * pl.col("baseReserve") * pl.col("price")
+                ).sqrt()
+            ).alias("poolValue"),
+            (-(10000 - fee) / 10000 * value_in + value_out).alias("LVR"),
+            (fee / 10000 * value_in).alias("FEE"),
+        )
+        # gas units of the pool model, see pool_models.ConstantProductPool
+        .with_columns(
+            (
+                pl.col("LVR")
+                - pl.col("FEE")
+                - gas_cost(base_token, CONSTANT_PRODUCT.gas if gas is None else gas)
+            ).alias("ARB")
+        )
+    )
+    return collect_swaps_and_arbitrages(
+        blocks_price_events,
+        value_in,
+        (pl.col("baseIn") - pl.col("baseOut")).sign(),
+        interval,
+    )
+
+
+def v3_swaps_and_arbitrages(
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+    gas=None,
+):
+    blocks_price = scan_parameters(
+        network,
+        base_token,
+        quote_token,
+        fee,
+        use_instant_volatility,
+        interval,
+        window,
+        latency,
+    )
+    events = scan_events(
+        network, dex, base_token, quote_token, fee, columns=V3_EVENT_COLUMNS
+    ).rename({"price": "ammPrice"})
+
+    # fill the values of blocks without swaps, empty swap values are filled with 0
+    blocks_price_events = (
+        blocks_price.join(events, on="blockNumber", how="left")
+        .with_columns(
+            pl.col(["ammPrice", "liquidity", "tick"]).forward_fill().backward_fill()
+        )
+        .with_columns(pl.col(pl.Float64).fill_null(0.0).fill_nan(0.0))
+    )
+
+    value_in = pl.col("baseAmount").clip(lower_bound=0.0) * pl.col("price") + pl.col(
+        "quoteAmount"
+    ).clip(lower_bound=0.0)
+    value_out = pl.col("baseAmount").clip(upper_bound=0.0) * pl.col("price") + pl.col(
+        "quoteAmount"
+    ).clip(upper_bound=0.0)
+    blocks_price_events = (
+        blocks_price_events.with_columns(
+            (2 * pl.col("liquidity") * pl.col("price").sqrt()).alias("poolValue"),
+            (-(10000 - fee) / 10000 * value_in - value_out).alias("LVR"),
+            (fee / 10000 * value_in).alias("FEE"),
+        )
+        # gas units of the pool model, see pool_models.ConcentratedLiquidityPool
+        .with_columns(
+            (
+                pl.col("LVR")
+                - pl.col("FEE")
+                - gas_cost(
+                    base_token, CONCENTRATED_LIQUIDITY.gas if gas is None else gas
+                )
+            ).alias("ARB")
+        )
+    )
+    return collect_swaps_and_arbitrages(
+        blocks_price_events, value_in, pl.col("baseAmount").sign(), interval
+    )
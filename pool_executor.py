@@ -0,0 +1,154 @@
+"""
+process-parallel evaluation of many pools for the analysis drivers.
+
+The cex parameters of every ticker pair (see data_processor.cex_parameters)
+are computed once in the main process and placed in shared memory, column by
+column. Every pool is then evaluated by a worker process, which reads the
+parameters from the shared memory instead of receiving a pickled DataFrame.
+The results are returned in the order of the tasks.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from data_processor import (
+    cex_ticker,
+    cex_parameters,
+    compute_predictions,
+    read_pool_events,
+    add_historical_data,
+    add_pnl,
+    process_data,
+)
+
+ALIGNMENT = 64  # bytes, of every column in the shared memory
+
+
+def share_frame(df):
+    """
+    Copy the columns of (df) into a new shared memory block.
+    Returns the block and its description, (name, [(column, dtype, offset)], rows),
+    from which read_shared_frame rebuilds the frame.
+    """
+    columns = []
+    size = 0
+    for column in df.columns:
+        dtype = df[column].to_numpy().dtype
+        columns.append((column, dtype.str, size))
+        size += -(-len(df) * dtype.itemsize // ALIGNMENT) * ALIGNMENT
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for column, dtype, offset in columns:
+        np.ndarray(len(df), dtype=dtype, buffer=shm.buf, offset=offset)[:] = df[
+            column
+        ].to_numpy()
+    return (shm, (shm.name, columns, len(df)))
+
+
+def read_shared_frame(description):
+    """
+    Copy of the frame shared by share_frame.
+    """
+    (name, columns, rows) = description
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        df = pd.DataFrame(
+            {
+                column: np.ndarray(rows, dtype=dtype, buffer=shm.buf, offset=offset)
+                for column, dtype, offset in columns
+            },
+            copy=True,
+        )
+    finally:
+        shm.close()
+    return df
+
+
+def evaluate_pool(
+    description,
+    pool_model,
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee,
+    interval,
+    gas,
+):
+    """
+    (swaps, df) of one pool, in a worker process.
+    """
+    blocks_price = compute_predictions(read_shared_frame(description), fee)
+    events_df = read_pool_events(
+        pool_model, network, dex, base_token, quote_token, fee, blocks_price
+    )
+    blocks_price_events = add_historical_data(pool_model, blocks_price, events_df)
+    add_pnl(pool_model, blocks_price_events, base_token, fee, gas)
+    return process_data(pool_model, blocks_price_events, interval)
+
+
+def evaluate_pools(
+    network,
+    tasks,
+    use_instant_volatility,
+    interval,
+    window,
+    latency=None,
+    gas=None,
+    max_workers=None,
+):
+    """
+    (swaps, df) of every pool in (tasks), a list of
+    (pool_model, dex, base_token, quote_token, fee), in the same order.
+    The pools are evaluated by (max_workers) processes, all the cores by default.
+    """
+    # the parameters are shared by the pools of the same ticker pair
+    shared = {}
+    try:
+        for _, _, base_token, quote_token, _ in tasks:
+            ticker = cex_ticker(base_token, quote_token)
+            if ticker not in shared:
+                shared[ticker] = share_frame(
+                    cex_parameters(
+                        network,
+                        base_token,
+                        quote_token,
+                        use_instant_volatility,
+                        interval,
+                        window,
+                        latency,
+                    )
+                )
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers or max(1, min(len(tasks), os.cpu_count()))
+        ) as executor:
+            futures = [
+                executor.submit(
+                    evaluate_pool,
+                    shared[cex_ticker(base_token, quote_token)][1],
+                    pool_model,
+                    network,
+                    dex,
+                    base_token,
+                    quote_token,
+                    fee,
+                    interval,
+                    gas,
+                )
+                for pool_model, dex, base_token, quote_token, fee in tasks
+            ]
+            results = []
+            for (pool_model, dex, base_token, quote_token, fee), future in zip(
+                tasks, futures
+            ):
+                results.append(future.result())
+                print(
+                    f"{pool_model.name} {dex} {base_token}-{quote_token} {fee}bps done."
+                )
+    finally:
+        for shm, _ in shared.values():
+            shm.close()
+            shm.unlink()
+
+    return results
@@ -0,0 +1,140 @@
+"""
+pool models of data_processor: how the events of a kind of pool become its
+pool value and the PnL of the swaps, given the cex price.
+
+    CONSTANT_PRODUCT         Uniswap V2 and its forks
+    CONCENTRATED_LIQUIDITY   Uniswap V3 and its forks
+
+A new kind of pool is a PoolModel with its own events, pool value and PnL;
+the parameters, predictions and interval stages of data_processor are shared.
+"""
+import numpy as np
+from event_files import V2_EVENT_COLUMNS, V3_EVENT_COLUMNS, read_events
+from kernels import v2_pnl, v3_pnl
+
+
+class PoolModel:
+    name = None
+    # gas units of an arbitrage, selected from 5% percentile of gas
+    # cost distribution, assuming that the arbitrageurs optimized their codes.
+    # See https://twitter.com/atiselsts_eth/status/1719693946375258507
+    gas = None
+    state_columns = []  # pool state, carried over the blocks without swaps
+
+    def read_events(
+        self, network, dex, base_token, quote_token, fee, from_block, to_block
+    ):
+        raise NotImplementedError
+
+    def pool_value(self, df):
+        raise NotImplementedError
+
+    def pnl(self, df, fee, is_eth_base, gas=None):
+        """
+        (potential) arbitrage profit after swap fee and (gas) units of gas
+        (self.gas if not given) plus the L1 data fee of gas_costs.py:
+        LVR (trader's PnL without swap fee and gas cost), fee income, and ARB.
+        """
+        raise NotImplementedError
+
+    def swap_size(self, swaps):
+        raise NotImplementedError
+
+    def swap_direction(self, df):
+        """
+        +1 for a swap selling the base token into the pool, -1 for a swap
+        buying it, and 0 for rows without a swap.
+        """
+        raise NotImplementedError
+
+
+class ConstantProductPool(PoolModel):
+    name = "V2"
+    gas = 140000
+    state_columns = ["totalSupply", "baseReserve", "quoteReserve"]
+
+    def read_events(
+        self, network, dex, base_token, quote_token, fee, from_block, to_block
+    ):
+        # the fee is not a part of the pool address
+        return read_events(
+            network,
+            dex,
+            base_token,
+            quote_token,
+            columns=V2_EVENT_COLUMNS,
+            from_block=from_block,
+            to_block=to_block,
+        )
+
+    def pool_value(self, df):
+        # this is immune to pool value manipulation from flashloan and sandwich attack
+        return 2 * np.sqrt(df["quoteReserve"] * df["baseReserve"] * df["price"])
+
+    def pnl(self, df, fee, is_eth_base, gas=None):
+        return v2_pnl(
+            df["baseIn"],
+            df["quoteIn"],
+            df["baseOut"],
+            df["quoteOut"],
+            df["price"],
+            df["baseFeePerGas"],
+            df["l1DataFee"],
+            fee,
+            self.gas if gas is None else gas,
+            is_eth_base,
+        )
+
+    def swap_size(self, swaps):
+        return swaps["baseIn"] * swaps["price"] + swaps["quoteIn"]
+
+    def swap_direction(self, df):
+        return np.sign(df["baseIn"] - df["baseOut"])
+
+
+class ConcentratedLiquidityPool(PoolModel):
+    name = "V3"
+    gas = 120000
+    state_columns = ["ammPrice", "liquidity", "tick"]
+
+    def read_events(
+        self, network, dex, base_token, quote_token, fee, from_block, to_block
+    ):
+        events_df = read_events(
+            network,
+            dex,
+            base_token,
+            quote_token,
+            fee,
+            columns=V3_EVENT_COLUMNS,
+            from_block=from_block,
+            to_block=to_block,
+        )
+        return events_df.rename(columns={"price": "ammPrice"})
+
+    def pool_value(self, df):
+        return 2 * df["liquidity"] * np.sqrt(df["price"])
+
+    def pnl(self, df, fee, is_eth_base, gas=None):
+        return v3_pnl(
+            df["baseAmount"],
+            df["quoteAmount"],
+            df["price"],
+            df["baseFeePerGas"],
+            df["l1DataFee"],
+            fee,
+            self.gas if gas is None else gas,
+            is_eth_base,
+        )
+
+    def swap_size(self, swaps):
+        return swaps["baseAmount"].clip(lower=0.0) * swaps["price"] + swaps[
+            "quoteAmount"
+        ].clip(lower=0.0)
+
+    def swap_direction(self, df):
+        return np.sign(df["baseAmount"])
+
+
+CONSTANT_PRODUCT = ConstantProductPool()
+CONCENTRATED_LIQUIDITY = ConcentratedLiquidityPool()
@@ -1,42 +1,83 @@
-import polars as pl
+import io
+import os
+import sys
+import glob
+import zipfile
+import numpy as np
+import pandas as pd
+from price_store import append_prices
 
 """
-extract timestamp and opens from csv file downloaded at https://www.binance.com/en/landing/data
-put original data into raw/ and add the path to .gitignore to avoid the upload error.
+extract timestamp and opens from the 1s kline archives downloaded at https://www.binance.com/en/landing/data
+put original data (zip or csv) into raw/ and add the path to .gitignore to avoid the upload error.
+the prices are appended to the binary store of price_store.py, one chunk at a time,
+so any number of months fits in memory. Seconds missing from the archives are forward-filled.
+
+    python price_formatter.py                               every archive in raw/ of TICKERS
+    python price_formatter.py ETHUSD ETHUSDT-1s-2024-*.zip  the given archives, in order
 """
 
-# ETHUSD
-ETHUSD_oct = pl.read_csv(
-    "./data/cex_price/raw/ETHUSD-1s-2023-10.csv", has_header=False
-).select(["column_1", "column_2"])
-ETHUSD_oct.columns = ["timestamp", "price"]
-ETHUSD_oct = ETHUSD_oct.with_columns(pl.col("timestamp") // 1000)
-
-ETHUSD_nov = pl.read_csv(
-    "./data/cex_price/raw/ETHUSD-1s-2023-11.csv", has_header=False
-).select(["column_1", "column_2"])
-ETHUSD_nov.columns = ["timestamp", "price"]
-ETHUSD_nov = ETHUSD_nov.with_columns(pl.col("timestamp") // 1000)
-
-ETHUSD_total = pl.concat([ETHUSD_oct, ETHUSD_nov])
-ETHUSD_total.write_csv("./data/cex_price/ETHUSD_total.csv")
-
-###################################################################################
-#                              repeat for new pairs                               #
-###################################################################################
-
-# ETHBTC
-ETHBTC_oct = pl.read_csv(
-    "./data/cex_price/raw/ETHBTC-1s-2023-10.csv", has_header=False
-).select(["column_1", "column_2"])
-ETHBTC_oct.columns = ["timestamp", "price"]
-ETHBTC_oct = ETHBTC_oct.with_columns(pl.col("timestamp") // 1000)
-
-ETHBTC_nov = pl.read_csv(
-    "./data/cex_price/raw/ETHBTC-1s-2023-11.csv", has_header=False
-).select(["column_1", "column_2"])
-ETHBTC_nov.columns = ["timestamp", "price"]
-ETHBTC_nov = ETHBTC_nov.with_columns(pl.col("timestamp") // 1000)
-
-ETHBTC_total = pl.concat([ETHBTC_oct, ETHBTC_nov])
-ETHBTC_total.write_csv("./data/cex_price/ETHBTC_total.csv")
+RAW_PATH = "./data/cex_price/raw"
+TICKERS = ["ETHUSD", "ETHBTC"]
+CHUNK_ROWS = 1_000_000
+
+
+def read_klines(path, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (timestamp in seconds, open price) arrays of the kline archive,
+    (chunk_rows) rows at a time. The open time is in milliseconds,
+    or in microseconds for the archives since 2025.
+    """
+
+    def open_csv():
+        if path.endswith(".zip"):
+            archive = zipfile.ZipFile(path)
+            return archive.open(archive.namelist()[0])
+        return open(path, "rb")
+
+    with open_csv() as f:
+        has_header = not f.readline()[:1].isdigit()
+    with open_csv() as f:
+        for chunk in pd.read_csv(
+            io.TextIOWrapper(f),
+            header=None,
+            skiprows=1 if has_header else 0,
+            usecols=[0, 1],
+            dtype={0: np.int64, 1: np.float64},
+            chunksize=chunk_rows,
+        ):
+            open_time = chunk[0].to_numpy()
+            unit = 10**6 if open_time[0] >= 10**15 else 10**3
+            yield (open_time // unit, chunk[1].to_numpy())
+
+
+def ingest(ticker, paths, dtype=np.float64, chunk_rows=CHUNK_ROWS):
+    """
+    Append the prices of the archives (paths), in chronological order, to the
+    store of the ticker. Rows already in the store are skipped.
+    """
+    last_timestamp = None
+    for path in paths:
+        appended = 0
+        for timestamp, price in read_klines(path, chunk_rows):
+            if last_timestamp is not None and timestamp[0] <= last_timestamp:
+                raise ValueError(
+                    f"{path}: timestamp {timestamp[0]} is not after {last_timestamp}."
+                )
+            last_timestamp = timestamp[-1]
+            appended += append_prices(ticker, timestamp, price, dtype)
+        print(f"{ticker}: {os.path.basename(path)}, {appended} seconds appended.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        ingest(sys.argv[1], sys.argv[2:])
+    else:
+        for ticker in TICKERS:
+            # e.g. ETHUSD-1s-2023-10.zip, the names sort in chronological order.
+            # A zip is preferred to the csv extracted from it.
+            paths = {
+                os.path.splitext(path)[0]: path
+                for path in sorted(glob.glob(f"{RAW_PATH}/{ticker}-1s-*"))
+            }
+            ingest(ticker, [paths[name] for name in sorted(paths)])
@@ -0,0 +1,333 @@
+"""
+binary store of the 1-second cex prices, written by price_formatter.py.
+
+data/cex_price/{ticker}_price.npy     dense prices of every second from start, NaN for gaps
+data/cex_price/{ticker}_price.json    {"start": first timestamp, "step": 1}
+
+The timestamp of a price is implied by its index, so the .npy file is opened
+with np.load(mmap_mode="r") in constant time, and the processes reading it
+share one copy in the page cache.
+The csv files of the earlier price_formatter are still read when a ticker has no store.
+
+A pair without prices of its own is derived from stored legs, e.g.
+BTCUSD = ETHUSD / ETHBTC, and cached in data/cex_price/cross/ (see cross_prices).
+"""
+import os
+import io
+import json
+import numpy as np
+import pandas as pd
+import polars as pl
+
+PRICE_PATH = "data/cex_price"
+CROSS_PATH = "data/cex_price/cross"
+CROSS_CURRENCIES = ["USD", "ETH", "BTC"]  # tried in order as the common leg of a cross
+
+_stores = {}
+
+
+def store_paths(ticker):
+    return (f"{PRICE_PATH}/{ticker}_price.npy", f"{PRICE_PATH}/{ticker}_price.json")
+
+
+def legacy_price_path(ticker):
+    return f"{PRICE_PATH}/{ticker}_total.csv"
+
+
+def price_paths(ticker):
+    """
+    files the prices of the ticker are read from.
+    """
+    if os.path.exists(store_paths(ticker)[0]):
+        return list(store_paths(ticker))
+    return [legacy_price_path(ticker)]
+
+
+def write_prices(ticker, timestamp, price, dtype=np.float64):
+    """
+    Replace the store of the ticker by the prices at (timestamp) in seconds.
+    Seconds without a price are stored as NaN. float32 halves the size.
+    """
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    start = int(timestamp.min())
+    prices = np.full(int(timestamp.max()) - start + 1, np.nan, dtype=dtype)
+    prices[timestamp - start] = price
+
+    (prices_path, meta_path) = store_paths(ticker)
+    os.makedirs(PRICE_PATH, exist_ok=True)
+    np.save(f"{prices_path}.tmp.npy", prices)
+    os.replace(f"{prices_path}.tmp.npy", prices_path)
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump({"start": start, "step": 1}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def append_prices(ticker, timestamp, price, dtype=np.float64, fill_gaps=True):
+    """
+    Append the prices at (timestamp), strictly increasing seconds, to the store of
+    the ticker, creating it with (dtype) if needed. Prices at or before the last
+    second of the store are skipped, so appending the same month twice is harmless.
+    The seconds without a price are forward-filled (fill_gaps) or NaN.
+    Return the number of seconds appended.
+    """
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    price = np.asarray(price, dtype=np.float64)
+    if np.any(np.diff(timestamp) <= 0):
+        raise ValueError(f"{ticker}: timestamps are not strictly increasing.")
+
+    (prices_path, meta_path) = store_paths(ticker)
+    if not os.path.exists(prices_path):
+        if len(timestamp) == 0:
+            return 0
+        os.makedirs(PRICE_PATH, exist_ok=True)
+        with open(prices_path, "wb") as f:
+            f.write(_npy_header(np.dtype(dtype), 0))
+        with open(meta_path, "w") as f:
+            json.dump({"start": int(timestamp[0]), "step": 1}, f)
+
+    with open(meta_path) as f:
+        start = json.load(f)["start"]
+    with open(prices_path, "r+b") as f:
+        np.lib.format.read_magic(f)
+        (shape, _, stored_dtype) = np.lib.format.read_array_header_1_0(f)
+        data_offset = f.tell()
+        length = shape[0]
+        # drop the partial rows of an interrupted append
+        f.truncate(data_offset + length * stored_dtype.itemsize)
+
+        last_price = np.nan
+        if length > 0:
+            f.seek(data_offset + (length - 1) * stored_dtype.itemsize)
+            last_price = np.frombuffer(f.read(stored_dtype.itemsize), stored_dtype)[0]
+
+        new = timestamp >= start + length
+        if not new.any():
+            return 0
+        positions = timestamp[new] - (start + length)
+        segment = np.full(positions[-1] + 1, np.nan)
+        segment[positions] = price[new]
+        if fill_gaps:
+            filled = np.maximum.accumulate(
+                np.where(np.isnan(segment), -1, np.arange(len(segment)))
+            )
+            segment = np.where(filled >= 0, segment[filled], last_price)
+
+        header = _npy_header(stored_dtype, length + len(segment))
+        f.seek(0, os.SEEK_END)
+        f.write(segment.astype(stored_dtype).tobytes())
+        if len(header) == data_offset:
+            f.seek(0)
+            f.write(header)
+    if len(header) != data_offset:
+        # the header grew, rewrite the whole file
+        prices = np.fromfile(prices_path, dtype=stored_dtype, offset=data_offset)
+        np.save(f"{prices_path}.tmp.npy", prices)
+        os.replace(f"{prices_path}.tmp.npy", prices_path)
+    return len(segment)
+
+
+def _npy_header(dtype, length):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, {"descr": dtype.str, "fortran_order": False, "shape": (length,)}
+    )
+    return header.getvalue()
+
+
+def open_prices(ticker):
+    """
+    (start, prices) of the store, prices being memory-mapped.
+    Return None if the ticker has no store.
+    """
+    (prices_path, meta_path) = store_paths(ticker)
+    if not os.path.exists(prices_path):
+        return None
+
+    version = (prices_path, os.path.getmtime(prices_path))
+    if version not in _stores:
+        with open(meta_path) as f:
+            start = json.load(f)["start"]
+        _stores[version] = (start, np.load(prices_path, mmap_mode="r"))
+    return _stores[version]
+
+
+def read_prices(ticker, from_timestamp=None, to_timestamp=None, copy=False):
+    """
+    DataFrame of (timestamp, price) of every second with a price,
+    from from_timestamp to to_timestamp (inclusive, the whole store by default).
+    The seconds are sliced out of the memory map, so the price column is
+    a read-only view of it unless (copy). Only a range with gaps (seconds
+    without a price) is copied, to drop them.
+    """
+    store = open_prices(ticker)
+    if store is None:
+        df = pd.read_csv(legacy_price_path(ticker))
+        if from_timestamp is not None:
+            df = df[df["timestamp"] >= from_timestamp]
+        if to_timestamp is not None:
+            df = df[df["timestamp"] <= to_timestamp]
+        return df.reset_index(drop=True)
+
+    (start, prices) = store
+    # the index of a second is its offset from start
+    first = 0 if from_timestamp is None else max(from_timestamp - start, 0)
+    last = len(prices) if to_timestamp is None else max(to_timestamp - start + 1, 0)
+    prices = prices[first:last]
+    timestamp = np.arange(start + first, start + first + len(prices))
+    # the sum is NaN if any price is, without a mask over the whole range
+    if np.isnan(prices.sum()):
+        seconds = np.flatnonzero(~np.isnan(prices))
+        (timestamp, prices) = (timestamp[seconds], prices[seconds])
+    prices = prices.astype(np.float64, copy=copy)
+    return pd.DataFrame({"timestamp": timestamp, "price": prices}, copy=False)
+
+
+def scan_prices(ticker):
+    """
+    polars LazyFrame of read_prices.
+    """
+    if open_prices(ticker) is None:
+        return pl.scan_csv(legacy_price_path(ticker))
+    return pl.from_pandas(read_prices(ticker)).lazy()
+
+
+############################################################
+#                       cross rates                        #
+############################################################
+
+
+def read_pair_prices(base_ticker, quote_ticker):
+    """
+    read_prices of the pair, derived from other pairs if it has no prices of its own.
+    """
+    ticker = f"{base_ticker}{quote_ticker}"
+    if _has_prices(ticker):
+        return read_prices(ticker)
+
+    (start, prices) = cross_prices(base_ticker, quote_ticker)
+    seconds = np.flatnonzero(~np.isnan(prices))
+    return pd.DataFrame({"timestamp": start + seconds, "price": prices[seconds]})
+
+
+def scan_pair_prices(base_ticker, quote_ticker):
+    """
+    polars LazyFrame of read_pair_prices.
+    """
+    ticker = f"{base_ticker}{quote_ticker}"
+    if _has_prices(ticker):
+        return scan_prices(ticker)
+    return pl.from_pandas(read_pair_prices(base_ticker, quote_ticker)).lazy()
+
+
+def pair_price_paths(base_ticker, quote_ticker):
+    """
+    files the prices of the pair are read or derived from.
+    """
+    ticker = f"{base_ticker}{quote_ticker}"
+    if _has_prices(ticker):
+        return price_paths(ticker)
+    return [
+        path
+        for leg, _ in _cross_legs(base_ticker, quote_ticker)
+        for path in price_paths(leg)
+    ]
+
+
+def cross_prices(base_ticker, quote_ticker):
+    """
+    (start, prices) of the pair, the inverse of a stored pair, or from its two
+    legs through a common currency:
+        base/quote = (base/via) / (quote/via)
+    where a leg is a stored pair or the inverse of one. The prices are computed
+    over the seconds covered by both legs, NaN where either leg has a gap,
+    and cached until a leg changes.
+    """
+    legs = _cross_legs(base_ticker, quote_ticker)
+    signature = [
+        [path, os.stat(path).st_size, os.stat(path).st_mtime_ns]
+        for leg, _ in legs
+        for path in price_paths(leg)
+    ]
+    prices_path = f"{CROSS_PATH}/{base_ticker}{quote_ticker}_price.npy"
+    meta_path = f"{CROSS_PATH}/{base_ticker}{quote_ticker}_price.json"
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["legs"] == signature and os.path.exists(prices_path):
+            return (meta["start"], np.load(prices_path, mmap_mode="r"))
+
+    if len(legs) == 1:
+        (start, prices) = _dense_prices(*legs[0])
+    else:
+        ((base_start, base_prices), (quote_start, quote_prices)) = [
+            _dense_prices(leg, inverse) for leg, inverse in legs
+        ]
+        start = max(base_start, quote_start)
+        end = min(base_start + len(base_prices), quote_start + len(quote_prices))
+        if end <= start:
+            raise ValueError(
+                f"{base_ticker}{quote_ticker}: {legs[0][0]} and {legs[1][0]} do not overlap."
+            )
+        prices = (
+            base_prices[start - base_start : end - base_start]
+            / quote_prices[start - quote_start : end - quote_start]
+        )
+
+    os.makedirs(CROSS_PATH, exist_ok=True)
+    np.save(f"{prices_path}.tmp.npy", prices)
+    os.replace(f"{prices_path}.tmp.npy", prices_path)
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump({"start": start, "step": 1, "legs": signature}, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    print(
+        f"{base_ticker}{quote_ticker} derived from {' and '.join(leg for leg, _ in legs)}."
+    )
+    return (start, prices)
+
+
+def _cross_legs(base_ticker, quote_ticker):
+    """
+    [(ticker, inverse)] of the pair itself, or of the base/via and quote/via legs.
+    """
+
+    def leg(base, quote):
+        if _has_prices(f"{base}{quote}"):
+            return (f"{base}{quote}", False)
+        if _has_prices(f"{quote}{base}"):
+            return (f"{quote}{base}", True)
+        return None
+
+    if leg(base_ticker, quote_ticker) is not None:
+        return [leg(base_ticker, quote_ticker)]
+    for via in CROSS_CURRENCIES:
+        if via in (base_ticker, quote_ticker):
+            continue
+        legs = [leg(base_ticker, via), leg(quote_ticker, via)]
+        if None not in legs:
+            return legs
+    raise FileNotFoundError(
+        f"no prices of {base_ticker}{quote_ticker}, nor legs to derive them "
+        f"through {CROSS_CURRENCIES} in {PRICE_PATH}."
+    )
+
+
+def _has_prices(ticker):
+    return os.path.exists(store_paths(ticker)[0]) or os.path.exists(
+        legacy_price_path(ticker)
+    )
+
+
+def _dense_prices(ticker, inverse=False):
+    """
+    (start, prices) of every second of the ticker, NaN for gaps.
+    """
+    store = open_prices(ticker)
+    if store is None:
+        df = pd.read_csv(legacy_price_path(ticker))
+        start = int(df["timestamp"].iloc[0])
+        prices = np.full(int(df["timestamp"].iloc[-1]) - start + 1, np.nan)
+        prices[df["timestamp"].to_numpy() - start] = df["price"].to_numpy()
+        store = (start, prices)
+    (start, prices) = store
+    prices = np.asarray(prices, dtype=np.float64)
+    return (start, 1 / prices if inverse else prices)
@@ -0,0 +1,231 @@
+"""
+on-disk cache of JSON-RPC responses, placed underneath the web3 providers.
+
+Only requests pinned to an explicit block are cached, since their responses
+never change: eth_call / eth_getBlockByNumber at a block number, and
+eth_getLogs over a numeric block range. A block after the "finalized" block
+of the provider may still be reorged, so such requests are answered by the
+provider without being cached. The tag is resolved by every chain itself:
+a fixed depth of 64 blocks is two epochs on Ethereum but seconds on Arbitrum,
+whose blocks are final only once their batch is finalized on Ethereum.
+Entries are keyed by the hash of (chain id, method, params) and the least
+recently used ones are evicted once the cache grows over (max_bytes).
+"""
+import json
+import time
+import sqlite3
+import hashlib
+
+CACHE_PATH = "data/rpc_cache.sqlite"
+
+FINALIZED_PARAMS = ["finalized", False]  # eth_getBlockByNumber of the finalized block
+FINALIZED_REFRESH = 12  # seconds before the finalized block is requested again
+
+CACHEABLE_METHODS = [
+    "eth_chainId",
+    "eth_call",
+    "eth_getBlockByNumber",
+    "eth_getLogs",
+]
+
+
+class RPCCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=2 * 1024**3, evict_every=100):
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.writes = 0
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_access REAL)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS last_access_index ON responses (last_access)"
+        )
+
+    def get(self, key):
+        row = self.db.execute(
+            "SELECT value FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute(
+            "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+        )
+        return json.loads(row[0])
+
+    def set(self, key, response):
+        value = json.dumps(response).encode()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time()),
+        )
+        self.writes += 1
+        if self.writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        drop the least recently used entries until the cache fits in max_bytes.
+        """
+        total_bytes = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        for key, size in self.db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ).fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total_bytes -= size
+            if total_bytes <= self.max_bytes:
+                break
+
+
+def is_block_number(block_identifier):
+    return isinstance(block_identifier, int) or (
+        isinstance(block_identifier, str) and block_identifier.startswith("0x")
+    )
+
+
+def is_cacheable(method, params):
+    if method not in CACHEABLE_METHODS:
+        return False
+    if method == "eth_chainId":
+        return True
+    if method == "eth_getLogs":
+        filter_params = params[0]
+        return "blockHash" in filter_params or (
+            is_block_number(filter_params.get("fromBlock"))
+            and is_block_number(filter_params.get("toBlock"))
+        )
+    if method == "eth_call":
+        return len(params) > 1 and is_block_number(params[1])
+    return is_block_number(params[0])  # eth_getBlockByNumber
+
+
+def pinned_block(method, params):
+    """
+    highest block number the cacheable request depends on,
+    None if it depends on no block number (eth_chainId, a block hash).
+    """
+    if method == "eth_chainId":
+        return None
+    if method == "eth_getLogs":
+        if "blockHash" in params[0]:
+            return None
+        block_identifier = params[0]["toBlock"]
+    elif method == "eth_call":
+        block_identifier = params[1]
+    else:
+        block_identifier = params[0]  # eth_getBlockByNumber
+    return to_int(block_identifier)
+
+
+def to_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def finalized_block(response):
+    """
+    number of the "finalized" block from the response of eth_getBlockByNumber,
+    -1 (nothing is cached) if the provider does not support the tag.
+    """
+    if "error" in response or response.get("result") is None:
+        return -1
+    return to_int(response["result"]["number"])
+
+
+def cache_key(chain_id, method, params):
+    return hashlib.sha256(
+        json.dumps([chain_id, method, params], sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def construct_disk_cache_middleware(cache):
+    """
+    web3 middleware which answers cacheable requests from (cache).
+    """
+
+    def disk_cache_middleware(make_request, w3):
+        chain_id = None
+        finalized = None
+        finalized_time = 0.0
+
+        def is_final(block):
+            nonlocal finalized, finalized_time
+            if block is None:
+                return True
+            if finalized is None or (
+                block > finalized and time.time() - finalized_time > FINALIZED_REFRESH
+            ):
+                finalized = finalized_block(
+                    make_request("eth_getBlockByNumber", FINALIZED_PARAMS)
+                )
+                finalized_time = time.time()
+            return block <= finalized
+
+        def middleware(method, params):
+            nonlocal chain_id
+            if not is_cacheable(method, params):
+                return make_request(method, params)
+            if chain_id is None:
+                chain_id = make_request("eth_chainId", [])["result"]
+
+            key = cache_key(chain_id, method, params)
+            response = cache.get(key)
+            if response is None:
+                response = make_request(method, params)
+                if "error" not in response and is_final(pinned_block(method, params)):
+                    cache.set(key, response)
+            return response
+
+        return middleware
+
+    return disk_cache_middleware
+
+
+def async_construct_disk_cache_middleware(cache):
+    """
+    AsyncWeb3 counterpart of construct_disk_cache_middleware.
+    """
+
+    async def async_disk_cache_middleware(make_request, async_w3):
+        chain_id = None
+        finalized = None
+        finalized_time = 0.0
+
+        async def is_final(block):
+            nonlocal finalized, finalized_time
+            if block is None:
+                return True
+            if finalized is None or (
+                block > finalized and time.time() - finalized_time > FINALIZED_REFRESH
+            ):
+                finalized = finalized_block(
+                    await make_request("eth_getBlockByNumber", FINALIZED_PARAMS)
+                )
+                finalized_time = time.time()
+            return block <= finalized
+
+        async def middleware(method, params):
+            nonlocal chain_id
+            if not is_cacheable(method, params):
+                return await make_request(method, params)
+            if chain_id is None:
+                chain_id = (await make_request("eth_chainId", []))["result"]
+
+            key = cache_key(chain_id, method, params)
+            response = cache.get(key)
+            if response is None:
+                response = await make_request(method, params)
+                if "error" not in response and await is_final(
+                    pinned_block(method, params)
+                ):
+                    cache.set(key, response)
+            return response
+
+        return middleware
+
+    return async_disk_cache_middleware
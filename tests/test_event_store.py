@@ -0,0 +1,45 @@
+import event_store
+from event_store import EventStore
+from fixed_point import limb_columns, to_int
+
+SYNCS = {"reserve0": "uint128", "reserve1": "uint128"}
+
+
+def syncs(block_numbers):
+    return {
+        "blockNumber": block_numbers,
+        "logIndex": [0] * len(block_numbers),
+        **limb_columns("reserve0", block_numbers, unsigned=True),
+        **limb_columns("reserve1", [2**128 - 1] * len(block_numbers), unsigned=True),
+    }
+
+
+def test_read_table_within_the_block_range(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_store, "STORE_PATH", str(tmp_path))
+    store = EventStore("pool")
+    assert store.open(100) == 100
+    store.write_initial({"syncs": syncs([100])})
+    store.write_chunk(100, 149, {"syncs": syncs([120, 149])})
+    store.write_chunk(150, 199, {"syncs": syncs([150, 180])})
+    store.write_chunk(200, 249, {"syncs": syncs([210])})
+
+    # an earlier run fetched up to block 250, this one stops at block 180
+    df = store.read_table("syncs", SYNCS, 100, 180)
+    assert df["blockNumber"].tolist() == [100, 120, 149, 150]
+    assert to_int(df, "reserve1").tolist() == [2**128 - 1] * 4
+
+
+def test_read_empty_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_store, "STORE_PATH", str(tmp_path))
+    store = EventStore("pool")
+    store.open(100)
+    df = store.read_table("syncs", SYNCS, 100, 180)
+    assert len(df) == 0
+    assert list(df.columns) == [
+        "blockNumber",
+        "logIndex",
+        "reserve0_limb0",
+        "reserve0_limb1",
+        "reserve1_limb0",
+        "reserve1_limb1",
+    ]
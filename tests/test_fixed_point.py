@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fixed_point import limb_columns, to_int, to_float
+from log_decoder import decode_v3_swap_logs
+
+
+@pytest.mark.parametrize(
+    "value, n_limbs", [(2**128 - 1, 2), (2**256 - 1, 4), (0, 2), (2**127, 2)]
+)
+def test_unsigned_round_trip(value, n_limbs):
+    df = pd.DataFrame(limb_columns("x", [value], n_limbs, unsigned=True))
+    assert to_int(df, "x")[0] == value
+    assert to_float(df, "x")[0] == float(value)
+
+
+@pytest.mark.parametrize("value", [-(2**127), -1, 2**127 - 1])
+def test_signed_round_trip(value):
+    df = pd.DataFrame(limb_columns("x", [value]))
+    assert to_int(df, "x")[0] == value
+    assert to_float(df, "x")[0] == float(value)
+
+
+def test_out_of_range():
+    with pytest.raises(OverflowError):
+        limb_columns("x", [2**128], unsigned=True)
+    with pytest.raises(OverflowError):
+        limb_columns("x", [-1], unsigned=True)
+    with pytest.raises(OverflowError):
+        limb_columns("x", [2**127])
+
+
+def test_decode_uint128_liquidity():
+    words = [-5, 7, 2**160 - 1, 2**128 - 1, -3]
+    log = {
+        "blockNumber": 1,
+        "logIndex": 0,
+        "data": b"".join(word.to_bytes(32, "big", signed=True) for word in words),
+    }
+    df = pd.DataFrame(decode_v3_swap_logs([log]))
+    assert df["liquidity_limb1"].dtype == np.uint64
+    assert to_int(df, "liquidity")[0] == 2**128 - 1
+    assert to_int(df, "sqrtPriceX96")[0] == 2**160 - 1
+    assert to_int(df, "amount0")[0] == -5
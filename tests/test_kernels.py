@@ -0,0 +1,7 @@
+import pytest
+from kernels import NUMBA_AVAILABLE, check_parity
+
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="numba is not installed")
+def test_numba_and_numpy_kernels_agree():
+    assert check_parity(n=100_000) == []
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fixed_point import to_int
+from log_decoder import TRANSFER_TOPIC, decode_v2_pair_logs, decode_v3_swap_logs
+
+
+def swap_log(words, block_number=1, log_index=0):
+    return {
+        "blockNumber": block_number,
+        "logIndex": log_index,
+        "data": b"".join(word.to_bytes(32, "big", signed=True) for word in words),
+    }
+
+
+def test_v3_tick():
+    logs = [
+        swap_log([1, -1, 2**96, 10**18, tick], log_index=i)
+        for i, tick in enumerate([-887272, -1, 0, 887272])
+    ]
+    swaps = decode_v3_swap_logs(logs)
+    assert swaps["tick"].dtype == np.int64
+    assert swaps["tick"].tolist() == [-887272, -1, 0, 887272]
+
+
+def test_v3_tick_not_sign_extended():
+    log = swap_log([1, -1, 2**96, 10**18, 0])
+    # a negative int24 whose upper bytes are zero
+    log["data"] = log["data"][:-32] + (2**64 - 1).to_bytes(32, "big")
+    with pytest.raises(OverflowError):
+        decode_v3_swap_logs([log])
+
+
+def transfer_log(from_address, to_address, value, log_index):
+    return {
+        "blockNumber": 1,
+        "logIndex": log_index,
+        "topics": [
+            TRANSFER_TOPIC,
+            bytes(12) + from_address,
+            bytes(12) + to_address,
+        ],
+        "data": value.to_bytes(32, "big"),
+    }
+
+
+def test_v2_minimum_liquidity_is_a_mint():
+    zero = bytes(20)
+    provider = bytes.fromhex("11" * 20)
+    logs = [
+        transfer_log(zero, zero, 1000, 0),  # MINIMUM_LIQUIDITY
+        transfer_log(zero, provider, 10**18, 1),
+        transfer_log(provider, zero, 10**17, 2),
+        transfer_log(provider, provider, 5, 3),
+    ]
+    (swaps, mints_and_burns, syncs) = decode_v2_pair_logs(logs)
+    amounts = to_int(pd.DataFrame(mints_and_burns), "amount")
+    assert amounts.tolist() == [1000, 10**18, -(10**17)]
+    assert amounts.sum() == 1000 + 10**18 - 10**17
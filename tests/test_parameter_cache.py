@@ -0,0 +1,69 @@
+from collections import OrderedDict
+import pandas as pd
+import pytest
+import parameter_cache
+from parameter_cache import cache_key, cached_frame
+from data_processor import cex_parameters_params
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(parameter_cache, "CACHE_PATH", str(tmp_path / "cache"))
+    monkeypatch.setattr(parameter_cache, "_frames", OrderedDict())
+    return tmp_path
+
+
+def counting(calls):
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"x": [len(calls)]})
+
+    return compute
+
+
+def test_hit_and_miss(cache):
+    path = cache / "input.csv"
+    path.write_text("a\n1\n")
+    calls = []
+
+    assert cached_frame("frame", [path], [1], counting(calls))["x"][0] == 1
+    assert cached_frame("frame", [path], [1], counting(calls))["x"][0] == 1
+    assert len(calls) == 1
+
+    # a hit on disk after the memory is cleared
+    parameter_cache._frames.clear()
+    assert cached_frame("frame", [path], [1], counting(calls))["x"][0] == 1
+    assert len(calls) == 1
+
+    # other parameters miss
+    assert cached_frame("frame", [path], [2], counting(calls))["x"][0] == 2
+    assert len(calls) == 2
+
+
+def test_changed_input_file_misses(cache):
+    path = cache / "input.csv"
+    path.write_text("a\n1\n")
+    key = cache_key("frame", [path], [1])
+    path.write_text("a\n1\n2\n")
+    assert cache_key("frame", [path], [1]) != key
+
+
+def test_returns_a_copy(cache):
+    calls = []
+    df = cached_frame("frame", [], [1], counting(calls))
+    df["x"] = 100
+    assert cached_frame("frame", [], [1], counting(calls))["x"][0] == 1
+
+
+@pytest.mark.parametrize(
+    "base_token, quote_token", [("WBTC", "WETH"), ("WETH", "USDC"), ("WETH", "DAI")]
+)
+def test_inverse_pair_has_another_key(base_token, quote_token):
+    # a pair and its inverse are derived from the same files, but are different frames
+    params = cex_parameters_params("MAINNET", base_token, quote_token, False, 3600, 10)
+    inverse_params = cex_parameters_params(
+        "MAINNET", quote_token, base_token, False, 3600, 10
+    )
+    assert cache_key("cex_parameters", [], params) != cache_key(
+        "cex_parameters", [], inverse_params
+    )
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import price_store
+from price_store import open_prices, read_prices, write_prices
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_PATH", str(tmp_path))
+    monkeypatch.setattr(price_store, "_stores", {})
+
+
+def test_read_prices_is_a_view_of_the_store():
+    write_prices("ETHUSD", np.arange(100, 200), np.arange(100.0, 200.0))
+    (start, prices) = open_prices("ETHUSD")
+
+    df = read_prices("ETHUSD", 150, 159)
+    assert df["timestamp"].tolist() == list(range(150, 160))
+    assert df["price"].tolist() == list(np.arange(150.0, 160.0))
+    assert np.shares_memory(df["price"].to_numpy(), prices)
+
+    df = read_prices("ETHUSD", 150, 159, copy=True)
+    assert not np.shares_memory(df["price"].to_numpy(), prices)
+    assert len(read_prices("ETHUSD")) == 100
+    assert len(read_prices("ETHUSD", 300)) == 0
+
+
+def test_read_prices_drops_the_gaps():
+    write_prices("ETHUSD", [100, 101, 105], [1.0, 2.0, 3.0])
+    df = read_prices("ETHUSD", 101)
+    assert df["timestamp"].tolist() == [101, 105]
+    assert df["price"].tolist() == [2.0, 3.0]
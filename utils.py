@@ -1,33 +1,180 @@
-def get_block_from_timestamp(w3, target_timestamp):
+import os
+import numpy as np
+import pandas as pd
+
+BLOCKS_PATH = "data/{network}_blocks"
+BLOCK_COLUMNS = ["blockNumber", "timestamp", "baseFeePerGas"]
+STABLECOINS = ["DAI", "FRAX"]  # priced as USD, besides the USD* tokens
+
+_block_indexes = {}
+
+
+def load_block_index(network):
+    """
+    (blockNumber, timestamp) arrays of the network, memory-mapped from .npy files.
+    The .npy files are written by blocks_formatter.py, or built from the blocks csv
+    of its earlier versions on first use, and rebuilt whenever the csv is newer.
+    Return None if there is no local block data for the network.
+    """
+    if network in _block_indexes:
+        return _block_indexes[network]
+
+    blocks_path = BLOCKS_PATH.format(network=network)
+    csv_path = f"{blocks_path}/blockNumber_timestamp_baseFeePerGas.csv"
+    numbers_path = f"{blocks_path}/blockNumber.npy"
+    timestamps_path = f"{blocks_path}/timestamp.npy"
+    if os.path.exists(f"{blocks_path}/blocks.json"):
+        pass  # compacted by blocks_formatter.py
+    elif not os.path.exists(csv_path):
+        return None
+    elif not os.path.exists(timestamps_path) or os.path.getmtime(
+        timestamps_path
+    ) < os.path.getmtime(csv_path):
+        blocks_df = pd.read_csv(
+            csv_path, usecols=["blockNumber", "timestamp"], dtype=np.int64
+        ).sort_values("blockNumber")
+        np.save(numbers_path, blocks_df["blockNumber"].to_numpy())
+        np.save(timestamps_path, blocks_df["timestamp"].to_numpy())
+
+    _block_indexes[network] = (
+        np.load(numbers_path, mmap_mode="r"),
+        np.load(timestamps_path, mmap_mode="r"),
+    )
+    return _block_indexes[network]
+
+
+def block_paths(network):
+    """
+    files the blocks of the network are read from.
+    """
+    blocks_path = BLOCKS_PATH.format(network=network)
+    if os.path.exists(f"{blocks_path}/blocks.json"):
+        return [f"{blocks_path}/{column}.npy" for column in BLOCK_COLUMNS] + [
+            f"{blocks_path}/blocks.json"
+        ]
+    return [f"{blocks_path}/blockNumber_timestamp_baseFeePerGas.csv"]
+
+
+def read_blocks(network, columns=BLOCK_COLUMNS):
+    """
+    DataFrame of the (columns) of every block of the network, sorted by blockNumber.
+    """
+    blocks_path = BLOCKS_PATH.format(network=network)
+    if not os.path.exists(f"{blocks_path}/blocks.json"):
+        return pd.read_csv(
+            f"{blocks_path}/blockNumber_timestamp_baseFeePerGas.csv", usecols=columns
+        )
+    return pd.DataFrame(
+        {
+            column: np.load(f"{blocks_path}/{column}.npy", mmap_mode="r")
+            for column in columns
+        },
+        copy=True,
+    )
+
+
+def get_block_from_timestamp(w3, target_timestamp, network=None):
     """
-    Find the earliest block after the given timestamp using binary search.
+    Find the earliest block at or after the given timestamp.
     Then return the block number and timestamp.
+
+    The local block index of the network answers the lookup with a searchsorted.
+    Outside of the local data (or across a gap in it), the block is searched
+    over RPC, with the local data as bounds whenever possible.
     """
-    latest_block = w3.eth.get_block("latest")
+    index = load_block_index(network) if network is not None else None
+    if index is None or len(index[0]) == 0:
+        return search_block_by_rpc(w3, target_timestamp)
+
+    (numbers, timestamps) = index
+    i = int(np.searchsorted(timestamps, target_timestamp, side="left"))
+    if i == len(numbers):
+        # after the local data
+        return search_block_by_rpc(
+            w3, target_timestamp, low=(int(numbers[-1]), int(timestamps[-1]))
+        )
+    if i == 0:
+        if timestamps[0] == target_timestamp:
+            return (int(numbers[0]), int(timestamps[0]))
+        # before the local data
+        return search_block_by_rpc(
+            w3, target_timestamp, high=(int(numbers[0]), int(timestamps[0]))
+        )
+    if numbers[i] - numbers[i - 1] > 1:
+        # gap in the local data
+        return search_block_by_rpc(
+            w3,
+            target_timestamp,
+            low=(int(numbers[i - 1]), int(timestamps[i - 1])),
+            high=(int(numbers[i]), int(timestamps[i])),
+        )
+    return (int(numbers[i]), int(timestamps[i]))
 
-    # binary search
-    low = 0
-    high = latest_block.number
-    while low <= high:
-        mid = (low + high) // 2
-        mid_timestamp = w3.eth.get_block(mid).timestamp
 
-        if mid_timestamp < target_timestamp:
-            low = mid + 1
-        elif mid_timestamp > target_timestamp:
-            high = mid - 1
+def search_block_by_rpc(w3, target_timestamp, low=None, high=None):
+    """
+    Interpolation search of the earliest block at or after the given timestamp,
+    between the (blockNumber, timestamp) bounds low and high.
+    The next guess assumes constant block time between the bounds;
+    we fall back to bisection whenever a guess does not halve the range.
+    """
+    if high is None:
+        latest_block = w3.eth.get_block("latest")
+        high = (latest_block.number, latest_block.timestamp)
+    if high[1] < target_timestamp:
+        return high  # target is in the future
+    if low is None:
+        low = (0, w3.eth.get_block(0).timestamp)
+    if low[1] >= target_timestamp:
+        return low
+
+    # invariant: low timestamp < target timestamp <= high timestamp
+    interpolate = True
+    while high[0] - low[0] > 1:
+        if interpolate:
+            guess = low[0] + int(
+                (target_timestamp - low[1]) * (high[0] - low[0]) / (high[1] - low[1])
+            )
+        else:
+            guess = (low[0] + high[0]) // 2
+        guess = min(max(guess, low[0] + 1), high[0] - 1)
+        guess_timestamp = w3.eth.get_block(guess).timestamp
+
+        range_size = high[0] - low[0]
+        if guess_timestamp < target_timestamp:
+            low = (guess, guess_timestamp)
         else:
-            return mid, mid_timestamp  # Exact match
-    return (
-        low,
-        w3.eth.get_block(low).timestamp,
-    )  # low_timestamp > target_timestamp > high_timestamp
+            high = (guess, guess_timestamp)
+        interpolate = high[0] - low[0] <= range_size // 2
+    return high
 
 
 def token_to_ticker(token):
+    """
+    cex currency of the token; the prices of a pair of currencies are read
+    or derived from other pairs by price_store.read_pair_prices.
+    """
     if token.endswith("ETH"):
         return "ETH"
     elif token.endswith("BTC"):
         return "BTC"
-    else:
+    elif "USD" in token or token in STABLECOINS:
         return "USD"
+    else:
+        return token
+
+
+def cex_latency(network, latency=None):
+    """
+    seconds between the cex price referred to and the block timestamp,
+    (latency) if given. May be fractional for sub-second price feeds.
+
+    For the case of Mainnet, we will refer the price 4 seconds before the block timestamp.
+    This is when the block building auction ends usually.
+    It is also turned out that arbitrageurs get maximal profit if they execute
+    the order at that moment. See
+    https://ethresear.ch/t/empirical-analysis-of-cross-domain-cex-dex-arbitrage-on-ethereum/17620
+    """
+    if latency is not None:
+        return latency
+    return 4 if network == "MAINNET" else 0
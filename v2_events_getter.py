@@ -2,21 +2,56 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 import web3
-from decimal import Decimal
 import time
+import numpy as np
 import pandas as pd
 from utils import *
+from log_fetcher import LogFetcher, RateLimiter, construct_rate_limit_middleware
+from event_store import EventStore
+from event_files import write_events
+from fixed_point import limb_columns, scale_columns
+from log_decoder import (
+    V2_SWAP_TOPIC,
+    TRANSFER_TOPIC,
+    SYNC_TOPIC,
+    V2_PAIR_TABLES,
+    decode_v2_pair_logs,
+)
+from rpc_cache import (
+    RPCCache,
+    construct_disk_cache_middleware,
+    async_construct_disk_cache_middleware,
+)
 
 load_dotenv()
 
 
 def query_v2_events(
-    start_timestamp, end_timestamp, network, dex, base_token, quote_token
+    start_timestamp,
+    end_timestamp,
+    network,
+    dex,
+    base_token,
+    quote_token,
+    max_in_flight=8,
+    requests_per_second=10,
+    rate_limiter=None,
 ):
     # settings
     w3 = web3.Web3(web3.Web3.HTTPProvider(os.getenv(f"{network}_ALCHEMY_URL")))
-    from_block = get_block_from_timestamp(w3, start_timestamp)[0]
-    to_block = get_block_from_timestamp(w3, end_timestamp)[0]
+    async_w3 = web3.AsyncWeb3(
+        web3.AsyncWeb3.AsyncHTTPProvider(os.getenv(f"{network}_ALCHEMY_URL"))
+    )
+    cache = RPCCache()
+    w3.middleware_onion.inject(construct_disk_cache_middleware(cache), layer=0)
+    # innermost, so the requests answered by the cache take no slot
+    rate_limiter = rate_limiter or RateLimiter(requests_per_second)
+    w3.middleware_onion.inject(construct_rate_limit_middleware(rate_limiter), layer=0)
+    async_w3.middleware_onion.inject(
+        async_construct_disk_cache_middleware(cache), layer=0
+    )
+    from_block = get_block_from_timestamp(w3, start_timestamp, network)[0]
+    to_block = get_block_from_timestamp(w3, end_timestamp, network)[0]
     print(f"Block range: {from_block}:{to_block}")
 
     # factory
@@ -28,111 +63,113 @@ def query_v2_events(
     # pair
     pair_address = dex_factory.functions.getPair(
         os.getenv(f"{network}_{base_token}"), os.getenv(f"{network}_{quote_token}")
-    ).call()
+    ).call(block_identifier=from_block)
     pair = w3.eth.contract(address=pair_address, abi=os.getenv("UNI_V2_PAIR_ABI"))
 
     # query the events
-    print(f"Querying the events on address {pair.address} ..")
-    chunk_size = 1800
-    swaps = []
-    mints_and_burns = []
-    syncs = []
-    for block_number in range(from_block, to_block, chunk_size):
-        time.sleep(0.1)
-        chunk_end = min(block_number + chunk_size, to_block) - 1
-
-        swap_logs = pair.events.Swap().get_logs(
-            fromBlock=block_number, toBlock=chunk_end
+    store = EventStore(f"{network}_{dex}_{base_token}_{quote_token}")
+    resume_block = store.open(from_block)
+    if not store.has_initial():
+        (reserve0, reserve1, _) = pair.functions.getReserves().call(
+            block_identifier=from_block - 1
         )
-        swaps.extend(
-            [
-                {
-                    "blockNumber": swap_log.blockNumber,
-                    "logIndex": swap_log.logIndex,
-                    "amount0In": Decimal(swap_log.args.amount0In),
-                    "amount1In": Decimal(swap_log.args.amount1In),
-                    "amount0Out": Decimal(swap_log.args.amount0Out),
-                    "amount1Out": Decimal(swap_log.args.amount1Out),
-                }
-                for swap_log in swap_logs
-            ]
+        store.write_initial(
+            {
+                "mints_and_burns": {
+                    "blockNumber": [from_block],
+                    "logIndex": [0],
+                    **limb_columns(
+                        "amount",
+                        [
+                            pair.functions.totalSupply().call(
+                                block_identifier=from_block - 1
+                            )
+                        ],
+                        n_limbs=3,
+                    ),
+                },
+                "syncs": {
+                    "blockNumber": [from_block],
+                    "logIndex": [0],
+                    **limb_columns("reserve0", [reserve0], unsigned=True),
+                    **limb_columns("reserve1", [reserve1], unsigned=True),
+                },
+            }
         )
 
-        mint_logs = pair.events.Transfer().get_logs(
-            fromBlock=block_number,
-            toBlock=chunk_end,
-            argument_filters={"from": "0x" + "0" * 40},
-        )
-        mints_and_burns.extend(
-            [
-                {
-                    "blockNumber": mint_log.blockNumber,
-                    "logIndex": mint_log.logIndex,
-                    "amount": Decimal(mint_log.args.value),
-                }
-                for mint_log in mint_logs
-            ]
-        )
+    fetcher = LogFetcher(max_in_flight, requests_per_second, rate_limiter=rate_limiter)
 
-        burn_logs = pair.events.Transfer().get_logs(
-            fromBlock=block_number,
-            toBlock=chunk_end,
-            argument_filters={"to": "0x" + "0" * 40},
+    def on_chunk(chunk_start, chunk_end, logs):
+        """
+        one eth_getLogs for all three events, then split and decode them locally.
+        """
+        (swaps, mints_and_burns, syncs) = decode_v2_pair_logs(logs)
+        store.write_chunk(
+            chunk_start,
+            chunk_end,
+            {"swaps": swaps, "mints_and_burns": mints_and_burns, "syncs": syncs},
         )
-        mints_and_burns.extend(
-            [
-                {
-                    "blockNumber": burn_log.blockNumber,
-                    "logIndex": burn_log.logIndex,
-                    "amount": Decimal(-burn_log.args.value),
-                }
-                for burn_log in burn_logs
-            ]
+
+    if resume_block < to_block:
+        print(f"Querying the events on address {pair.address} ..")
+        fetcher.run(
+            async_w3,
+            {
+                "address": pair_address,
+                "topics": [
+                    [V2_SWAP_TOPIC.hex(), TRANSFER_TOPIC.hex(), SYNC_TOPIC.hex()]
+                ],
+            },
+            on_chunk,
+            resume_block,
+            to_block,
+            key=store.name,
         )
 
-        sync_logs = pair.events.Sync().get_logs(
-            fromBlock=block_number,
-            toBlock=chunk_end,
+    # decimals of the tokens
+    is_base_token_token0 = os.getenv(f"{network}_{base_token}") < os.getenv(
+        f"{network}_{quote_token}"
+    )
+    base_decimals = (
+        w3.eth.contract(
+            address=os.getenv(f"{network}_{base_token}"), abi=os.getenv("ERC20_ABI")
         )
-        syncs.extend(
-            [
-                {
-                    "blockNumber": sync_log.blockNumber,
-                    "logIndex": sync_log.logIndex,
-                    "reserve0": Decimal(sync_log.args.reserve0),
-                    "reserve1": Decimal(sync_log.args.reserve1),
-                }
-                for sync_log in sync_logs
-            ]
+        .functions.decimals()
+        .call(block_identifier=from_block)
+    )
+    quote_decimals = (
+        w3.eth.contract(
+            address=os.getenv(f"{network}_{quote_token}"), abi=os.getenv("ERC20_ABI")
         )
+        .functions.decimals()
+        .call(block_identifier=from_block)
+    )
+    if is_base_token_token0:
+        (decimals0, decimals1) = (base_decimals, quote_decimals)
+    else:
+        (decimals0, decimals1) = (quote_decimals, base_decimals)
 
-    mints_and_burns = [
-        {
-            "blockNumber": from_block,
-            "logIndex": 0,
-            "amount": Decimal(
-                pair.functions.totalSupply().call(block_identifier=from_block - 1)
-            ),
-        }
-    ] + mints_and_burns
-    syncs = [
-        {
-            "blockNumber": from_block,
-            "logIndex": 0,
-            "reserve0": Decimal(
-                pair.functions.getReserves().call(block_identifier=from_block - 1)[0]
-            ),
-            "reserve1": Decimal(
-                pair.functions.getReserves().call(block_identifier=from_block - 1)[1]
-            ),
-        }
-    ] + syncs
-
-    # create DFs from list of dictionary
+    # create DFs from the stored chunks, rescaled into float64
     print("Constructing DataFrame..")
-    df_swaps = pd.DataFrame(swaps)
-    df_mints_and_burns = pd.DataFrame(mints_and_burns)
-    df_syncs = pd.DataFrame(syncs)
+    df_swaps = scale_columns(
+        store.read_table("swaps", V2_PAIR_TABLES["swaps"], from_block, to_block),
+        {
+            "amount0In": decimals0,
+            "amount1In": decimals1,
+            "amount0Out": decimals0,
+            "amount1Out": decimals1,
+        },
+    )
+    df_mints_and_burns = scale_columns(
+        store.read_table(
+            "mints_and_burns", V2_PAIR_TABLES["mints_and_burns"], from_block, to_block
+        ),
+        {"amount": int((base_decimals + quote_decimals) / 2)},
+    )
+    df_syncs = scale_columns(
+        store.read_table("syncs", V2_PAIR_TABLES["syncs"], from_block, to_block),
+        {"reserve0": decimals0, "reserve1": decimals1},
+    )
 
     # join them
     df = pd.merge(
@@ -145,9 +182,6 @@ def query_v2_events(
 
     # replace column names
     print("Replacing the column names..")
-    is_base_token_token0 = os.getenv(f"{network}_{base_token}") < os.getenv(
-        f"{network}_{quote_token}"
-    )
     if is_base_token_token0:
         df.rename(
             columns={
@@ -177,54 +211,27 @@ def query_v2_events(
 
     # forward fill the reserves
     for column_name in ["quoteReserve", "baseReserve"]:
-        df[column_name].replace(Decimal(0), pd.NA, inplace=True)
-        df[column_name].ffill(inplace=True)
-    df.fillna(Decimal(0), inplace=True)
+        df[column_name] = df[column_name].replace(0.0, np.nan).ffill()
+    df.fillna(0.0, inplace=True)
 
-    # rescale the numbers
-    print("Rescaling the numbers..")
+    # accumulate the mints and burns
     df["totalSupply"] = df["totalSupply"].cumsum()
-    base_decimals = (
-        w3.eth.contract(
-            address=os.getenv(f"{network}_{base_token}"), abi=os.getenv("ERC20_ABI")
-        )
-        .functions.decimals()
-        .call()
-    )
-    quote_decimals = (
-        w3.eth.contract(
-            address=os.getenv(f"{network}_{quote_token}"), abi=os.getenv("ERC20_ABI")
-        )
-        .functions.decimals()
-        .call()
-    )
-
-    df["baseIn"] /= Decimal(10**base_decimals)
-    df["baseOut"] /= Decimal(10**base_decimals)
-    df["baseReserve"] /= Decimal(10**base_decimals)
-    df["quoteOut"] /= Decimal(10**quote_decimals)
-    df["quoteIn"] /= Decimal(10**quote_decimals)
-    df["quoteReserve"] /= Decimal(10**quote_decimals)
-    df["totalSupply"] /= Decimal(10 ** int((base_decimals + quote_decimals) / 2))
 
     # filter the rows
     print("Filtering the rows..")
     filtered_df = df[
-        (df["quoteIn"] != Decimal(0))
-        | (df["baseIn"] != Decimal(0))
-        | (df["quoteOut"] != Decimal(0))
-        | (df["baseOut"] != Decimal(0))
+        (df["quoteIn"] != 0.0)
+        | (df["baseIn"] != 0.0)
+        | (df["quoteOut"] != 0.0)
+        | (df["baseOut"] != 0.0)
     ]
     final_df = pd.concat(
         [df.iloc[:1], filtered_df], ignore_index=True
     ).drop_duplicates()
 
-    # save into csv file
-    print("Saving the DataFrame into csv file..")
-    final_df.to_csv(
-        f"data/onchain_events/{network}_{dex}_{base_token}_{quote_token}_events.csv",
-        index=False,
-    )
+    # save into parquet files
+    print("Saving the DataFrame into parquet files..")
+    write_events(final_df, network, dex, base_token, quote_token)
 
 
 if __name__ == "__main__":
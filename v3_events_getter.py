@@ -2,21 +2,50 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 import web3
-from decimal import Decimal
 import time
 import pandas as pd
 from utils import *
+from log_fetcher import LogFetcher, RateLimiter, construct_rate_limit_middleware
+from event_store import EventStore
+from event_files import write_events
+from fixed_point import limb_columns, scale_columns
+from log_decoder import V3_SWAP_TOPIC, V3_POOL_TABLES, decode_v3_swap_logs
+from rpc_cache import (
+    RPCCache,
+    construct_disk_cache_middleware,
+    async_construct_disk_cache_middleware,
+)
 
 load_dotenv()
 
 
 def query_v3_events(
-    start_timestamp, end_timestamp, network, dex, base_token, quote_token, fee_rate
+    start_timestamp,
+    end_timestamp,
+    network,
+    dex,
+    base_token,
+    quote_token,
+    fee_rate,
+    max_in_flight=8,
+    requests_per_second=10,
+    rate_limiter=None,
 ):
     # settings
     w3 = web3.Web3(web3.Web3.HTTPProvider(os.getenv(f"{network}_ALCHEMY_URL")))
-    from_block = get_block_from_timestamp(w3, start_timestamp)[0]
-    to_block = get_block_from_timestamp(w3, end_timestamp)[0]
+    async_w3 = web3.AsyncWeb3(
+        web3.AsyncWeb3.AsyncHTTPProvider(os.getenv(f"{network}_ALCHEMY_URL"))
+    )
+    cache = RPCCache()
+    w3.middleware_onion.inject(construct_disk_cache_middleware(cache), layer=0)
+    # innermost, so the requests answered by the cache take no slot
+    rate_limiter = rate_limiter or RateLimiter(requests_per_second)
+    w3.middleware_onion.inject(construct_rate_limit_middleware(rate_limiter), layer=0)
+    async_w3.middleware_onion.inject(
+        async_construct_disk_cache_middleware(cache), layer=0
+    )
+    from_block = get_block_from_timestamp(w3, start_timestamp, network)[0]
+    to_block = get_block_from_timestamp(w3, end_timestamp, network)[0]
     print(f"Block range: {from_block}:{to_block}")
 
     # factory
@@ -30,58 +59,97 @@ def query_v3_events(
         os.getenv(f"{network}_{base_token}"),
         os.getenv(f"{network}_{quote_token}"),
         fee_rate,
-    ).call()
+    ).call(block_identifier=from_block)
     pool = w3.eth.contract(address=pool_address, abi=os.getenv("UNI_V3_POOL_ABI"))
 
     # query the events
-    print(f"Querying the events on address {pool.address} ..")
-    chunk_size = 1800
-    swaps = [
-        {
-            "blockNumber": from_block,
-            "logIndex": 0,
-            "amount0": Decimal(0),
-            "amount1": Decimal(0),
-            "sqrtPriceX96": Decimal(
-                pool.functions.slot0().call(block_identifier=from_block)[0]
-            ),
-            "liquidity": Decimal(
-                pool.functions.liquidity().call(block_identifier=from_block)
-            ),
-        }
-    ]
-    for block_number in range(from_block, to_block, chunk_size):
-        chunk_end = min(block_number + chunk_size, to_block) - 1
-        time.sleep(0.1)
-
-        swap_logs = pool.events.Swap().get_logs(
-            fromBlock=block_number, toBlock=chunk_end
-        )
-        swaps.extend(
-            [
-                {
-                    "blockNumber": swap_log.blockNumber,
-                    "logIndex": swap_log.logIndex,
-                    "amount0": Decimal(swap_log.args.amount0),
-                    "amount1": Decimal(swap_log.args.amount1),
-                    "sqrtPriceX96": Decimal(swap_log.args.sqrtPriceX96),
-                    "liquidity": Decimal(swap_log.args.liquidity),
+    store = EventStore(
+        f"{network}_{dex}_{base_token}_{quote_token}_{int(fee_rate/100)}bps"
+    )
+    resume_block = store.open(from_block)
+    if not store.has_initial():
+        (sqrt_price_x96, tick) = pool.functions.slot0().call(
+            block_identifier=from_block
+        )[:2]
+        store.write_initial(
+            {
+                "swaps": {
+                    "blockNumber": [from_block],
+                    "logIndex": [0],
+                    **limb_columns("amount0", [0]),
+                    **limb_columns("amount1", [0]),
+                    **limb_columns(
+                        "sqrtPriceX96",
+                        [sqrt_price_x96],
+                        n_limbs=3,
+                        unsigned=True,
+                    ),
+                    **limb_columns(
+                        "liquidity",
+                        [pool.functions.liquidity().call(block_identifier=from_block)],
+                        unsigned=True,
+                    ),
+                    "tick": [tick],
                 }
-                for swap_log in swap_logs
-            ]
+            }
+        )
+
+    fetcher = LogFetcher(max_in_flight, requests_per_second, rate_limiter=rate_limiter)
+
+    def on_chunk(chunk_start, chunk_end, logs):
+        swaps = decode_v3_swap_logs(logs)
+        store.write_chunk(chunk_start, chunk_end, {"swaps": swaps})
+
+    if resume_block < to_block:
+        print(f"Querying the events on address {pool.address} ..")
+        fetcher.run(
+            async_w3,
+            {"address": pool_address, "topics": [V3_SWAP_TOPIC.hex()]},
+            on_chunk,
+            resume_block,
+            to_block,
+            key=store.name,
         )
 
-    # create DF from list of dictionary
+    # decimals of the tokens
+    is_base_token_token0 = os.getenv(f"{network}_{base_token}") < os.getenv(
+        f"{network}_{quote_token}"
+    )
+    base_decimals = (
+        w3.eth.contract(
+            address=os.getenv(f"{network}_{base_token}"), abi=os.getenv("ERC20_ABI")
+        )
+        .functions.decimals()
+        .call(block_identifier=from_block)
+    )
+    quote_decimals = (
+        w3.eth.contract(
+            address=os.getenv(f"{network}_{quote_token}"), abi=os.getenv("ERC20_ABI")
+        )
+        .functions.decimals()
+        .call(block_identifier=from_block)
+    )
+    if is_base_token_token0:
+        (decimals0, decimals1) = (base_decimals, quote_decimals)
+    else:
+        (decimals0, decimals1) = (quote_decimals, base_decimals)
+
+    # create DF from the stored chunks, rescaled into float64
     print("Constructing DataFrame..")
-    df = pd.DataFrame(swaps)
+    df = scale_columns(
+        store.read_table("swaps", V3_POOL_TABLES["swaps"], from_block, to_block),
+        {
+            "amount0": decimals0,
+            "amount1": decimals1,
+            "sqrtPriceX96": 0,
+            "liquidity": int((base_decimals + quote_decimals) / 2),
+        },
+    )
 
     # sort by blockNumber, then logIndex
     df.sort_values(by=["blockNumber", "logIndex"], inplace=True)
 
     # replace column names
-    is_base_token_token0 = os.getenv(f"{network}_{base_token}") < os.getenv(
-        f"{network}_{quote_token}"
-    )
     if is_base_token_token0:
         df.rename(
             columns={
@@ -101,45 +169,19 @@ def query_v3_events(
             inplace=True,
         )
 
-    # rescale the numbers
-    base_decimals = (
-        w3.eth.contract(
-            address=os.getenv(f"{network}_{base_token}"), abi=os.getenv("ERC20_ABI")
-        )
-        .functions.decimals()
-        .call()
-    )
-    quote_decimals = (
-        w3.eth.contract(
-            address=os.getenv(f"{network}_{quote_token}"), abi=os.getenv("ERC20_ABI")
-        )
-        .functions.decimals()
-        .call()
-    )
-
-    df["baseAmount"] /= Decimal(10**base_decimals)
-    df["quoteAmount"] /= Decimal(10**quote_decimals)
-    df["liquidity"] /= Decimal(10 ** int((base_decimals + quote_decimals) / 2))
-
+    # convert sqrtPriceX96 into price
     if is_base_token_token0:
         df["price"] = (
-            (df["price"] / Decimal(2**96)) ** 2
-            * Decimal(10**base_decimals)
-            / Decimal(10**quote_decimals)
+            (df["price"] / 2**96) ** 2 * 10**base_decimals / 10**quote_decimals
         )
     else:
         df["price"] = (
-            (Decimal(2**96) / df["price"]) ** 2
-            * Decimal(10**base_decimals)
-            / Decimal(10**quote_decimals)
+            (2**96 / df["price"]) ** 2 * 10**base_decimals / 10**quote_decimals
         )
 
-    # save into csv file
-    print("Saving into csv file..")
-    df.to_csv(
-        f"data/onchain_events/{network}_{dex}_{base_token}_{quote_token}_{int(fee_rate/100)}bps_events.csv",
-        index=False,
-    )
+    # save into parquet files
+    print("Saving into parquet files..")
+    write_events(df, network, dex, base_token, quote_token, int(fee_rate / 100))
 
 
 if __name__ == "__main__":
@@ -169,6 +211,7 @@ if __name__ == "__main__":
     """
     This is very time consuming operation.
     comment the several lines and run them separately.
+    An interrupted pool resumes from its checkpoint in data/onchain_events/raw/.
     """
     network = "ARBITRUM"
     for fee_rate in [500, 3000, 10000]:
@@ -0,0 +1,61 @@
+"""
+rolling volatility of the cex price, computed for every phase at once.
+
+The rows of a phase (timestamp modulo interval) are the non-overlapping
+(interval) returns ending at the same second. Within each phase the j-th sample
+(j = 1, 2, ..) gets
+    j = 1              instantaneous volatility 2 * (return - logReturn)
+    2 <= j < window    variance of the first j logReturns
+    j >= window        variance of the last (window) logReturns
+"""
+import numpy as np
+
+
+def rolling_vol_squared(modulus, returns, log_returns, window):
+    """
+    volSquared (not yet annualized) of every row, from the phase (modulus)
+    and the returns of each row.
+
+    The phases are laid out as the columns of a (samples, phases) array, so
+    the windowed sums of x and x^2 of every phase come from one cumulative sum.
+    Every phase is centered on its mean first, which does not change its
+    variance but keeps the cumulative sums small.
+    """
+    n = len(modulus)
+    order = np.argsort(modulus, kind="stable")
+    phases = np.asarray(modulus)[order]
+    starts = np.flatnonzero(np.r_[True, phases[1:] != phases[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    positions = np.arange(n) - np.repeat(starts, counts)  # j - 1
+    columns = np.repeat(np.arange(len(starts)), counts)
+
+    x = np.asarray(log_returns, dtype=np.float64)[order]
+    x = x - np.repeat(np.add.reduceat(x, starts) / counts, counts)
+
+    # cumulative sums of every phase, with a leading row of zeros
+    sums = np.zeros((counts.max() + 1, len(starts)))
+    squared_sums = np.zeros((counts.max() + 1, len(starts)))
+    sums[positions + 1, columns] = x
+    squared_sums[positions + 1, columns] = x * x
+    np.cumsum(sums, axis=0, out=sums)
+    np.cumsum(squared_sums, axis=0, out=squared_sums)
+
+    # sums over the last m = min(j, window) samples
+    m = np.minimum(positions + 1, window)
+    window_sum = sums[positions + 1, columns] - sums[positions + 1 - m, columns]
+    window_squared_sum = (
+        squared_sums[positions + 1, columns] - squared_sums[positions + 1 - m, columns]
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (window_squared_sum - window_sum**2 / m) / (m - 1)
+    variance = np.where(m > 1, np.maximum(variance, 0.0), np.nan)
+
+    # j = 1: we use instantaneous volatility
+    first = positions == 0
+    returns = np.asarray(returns, dtype=np.float64)[order]
+    log_returns = np.asarray(log_returns, dtype=np.float64)[order]
+    variance[first] = 2 * (returns[first] - log_returns[first])
+
+    vol_squared = np.empty(n)
+    vol_squared[order] = variance
+    return vol_squared